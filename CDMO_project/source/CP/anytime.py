@@ -0,0 +1,68 @@
+# anytime.py
+import asyncio
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import minizinc
+
+# Solving on the solution stream instead of the final Result only: every
+# intermediate solution is timestamped into an anytime curve [(seconds, objective)]
+# and written to cache/incumbents as it arrives, so a run that hits the time
+# limit (or is killed) still leaves its best schedule behind.
+
+INCUMBENT_DIR = Path(__file__).resolve().parents[2] / "cache" / "incumbents"
+
+def incumbent_path(runner: str, n: int, solver_name: str) -> Path:
+    return INCUMBENT_DIR / f"{runner}_{n}_{solver_name}.json"
+
+def save_incumbent(path: Path, elapsed: float, objective, solution: str):
+    """Write the latest incumbent atomically (write + rename)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"time": round(elapsed, 3), "obj": objective, "sol": solution}))
+    os.replace(tmp, path)
+
+def intermediate_flag(solver: minizinc.Solver) -> bool:
+    """Whether the solver can report intermediate solutions (-i or -a)"""
+    return "-i" in solver.stdFlags or "-a" in solver.stdFlags
+
+async def stream_solve_async(instance: minizinc.Instance, solver: minizinc.Solver, timeout: float, incumbent=None, offset: float = 0.0, **options):
+    """Solve through instance.solutions and return (result, curve).
+    result has the last solution and the final status, like instance.solve;
+    curve holds (seconds since start + offset, objective) for every solution.
+    If the run ends without a status (time limit, solver error) after a
+    solution arrived, that incumbent is returned as SATISFIED.
+    options go to instance.solutions (see tuning.solve_options)."""
+    if incumbent is not None and incumbent.exists():
+        incumbent.unlink()
+    start = time.time()
+    curve, solution, status, statistics = [], None, minizinc.Status.UNKNOWN, {}
+    try:
+        async for result in instance.solutions(timeout=timedelta(seconds=timeout), intermediate_solutions=intermediate_flag(solver), **options):
+            status = result.status
+            statistics.update(result.statistics)
+            if result.solution is not None:
+                solution = result.solution
+                elapsed = offset + time.time() - start
+                curve.append((round(elapsed, 3), result.objective))
+                if incumbent is not None:
+                    save_incumbent(incumbent, elapsed, result.objective, str(solution))
+    except minizinc.MiniZincError:
+        if solution is None:
+            raise
+    if solution is not None and status in (minizinc.Status.UNKNOWN, minizinc.Status.ERROR):
+        status = minizinc.Status.SATISFIED
+    return minizinc.Result(status, solution, statistics), curve
+
+def stream_solve(instance: minizinc.Instance, solver: minizinc.Solver, timeout: float, incumbent=None, offset: float = 0.0, **options):
+    return asyncio.run(stream_solve_async(instance, solver, timeout, incumbent, offset, **options))
+
+def time_to_target(curve, target=None):
+    """First time the curve reaches target (any solution if target is None); None if never"""
+    for elapsed, objective in curve:
+        if target is None or (objective is not None and objective <= target):
+            return elapsed
+    return None
@@ -0,0 +1,119 @@
+# fzn_cache.py
+import hashlib
+import json
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import minizinc
+from anytime import intermediate_flag, save_incumbent
+
+# Content-addressed cache of compiled FlatZinc (.fzn) and output model (.ozn) files.
+# The key hashes the model text, the parameters, the solver library (mznlib) and the
+# MiniZinc version, so solvers of one family (e.g. coin-bc and highs, which both use
+# the linear library) share a compilation, and the files survive between runs.
+
+CACHE_DIR = Path(__file__).resolve().parents[2] / "cache" / "fzn"
+
+class FznCache:
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self.saved = 0.0
+
+    def key(self, model_file: str, data: dict, solver: minizinc.Solver) -> str:
+        """Hash of everything the FlatZinc depends on"""
+        h = hashlib.sha256()
+        h.update(Path(model_file).read_bytes())
+        h.update(json.dumps(data, sort_keys=True).encode())
+        h.update((solver.mznlib or "std").encode())
+        h.update(".".join(map(str, minizinc.default_driver.parsed_version)).encode())
+        return h.hexdigest()[:24]
+
+    def compile(self, model_file: str, data: dict, solver: minizinc.Solver, time_limit: int = 300):
+        """Return the cached (fzn, ozn) paths for the instance, flattening it on a miss"""
+        key = self.key(model_file, data, solver)
+        fzn, ozn, meta = (self.cache_dir / f"{key}{ext}" for ext in (".fzn", ".ozn", ".json"))
+        if fzn.exists() and ozn.exists() and meta.exists():
+            self.hits += 1
+            self.saved += json.loads(meta.read_text())["flatten_time"]
+            return fzn, ozn
+        self.misses += 1
+        instance = minizinc.Instance(solver, minizinc.Model(model_file))
+        for name, value in data.items():
+            instance[name] = value
+        start_time = time.time()
+        # data may override model defaults (tuning.py configs)
+        with instance.flat(time_limit=timedelta(seconds=time_limit), **{"allow-multiple-assignments": True}) as (tmp_fzn, tmp_ozn, statistics):
+            shutil.copyfile(tmp_fzn.name, fzn)
+            shutil.copyfile(tmp_ozn.name, ozn)
+        meta.write_text(json.dumps({"model": str(model_file), "data": data, "solver": solver.id,
+                                    "flatten_time": time.time() - start_time}))
+        return fzn, ozn
+
+    def solve(self, model_file: str, data: dict, solver_name: str, timeout: int = 300, incumbent=None, offset: float = 0.0, flags=()):
+        """Same as anytime.stream_solve, but on the cached FlatZinc; solutions are the output text.
+        flags: extra solver flags (tuning.solver_flags).
+        Solutions are timestamped as the solver prints them, so the curve and the
+        incumbent file are kept up to date while it runs."""
+        solver = minizinc.Solver.lookup(solver_name)
+        start_time = time.time()
+        fzn, ozn = self.compile(model_file, data, solver, timeout)
+        remaining = max(1, int((timeout - (time.time() - start_time)) * 1000))
+        executable = str(minizinc.default_driver.executable)
+        cmd = [executable, "--solver", solver.id, "--time-limit", str(remaining), *flags]
+        if intermediate_flag(solver):
+            cmd.append("--intermediate-solutions")
+        if incumbent is not None and incumbent.exists():
+            incumbent.unlink()
+        raw, block, curve = [], [], []
+        with tempfile.TemporaryFile("w+") as stderr:
+            with subprocess.Popen(cmd + [str(fzn)], stdout=subprocess.PIPE, stderr=stderr, text=True) as proc:
+                for line in proc.stdout:
+                    raw.append(line)
+                    block.append(line)
+                    if line.strip() == "----------":
+                        elapsed = offset + time.time() - start_time
+                        objective = raw_objective("".join(block))
+                        curve.append((round(elapsed, 3), objective))
+                        if incumbent is not None:
+                            text = format_output(executable, ozn, "".join(block))
+                            save_incumbent(incumbent, elapsed, objective, text.split("----------")[0].strip())
+                        block = []
+            stderr.seek(0)
+            message = stderr.read()
+        raw = "".join(raw)
+        if proc.returncode != 0 and not curve:
+            raise minizinc.MiniZincError(message=message)
+        return parse_output(raw, format_output(executable, ozn, raw)), curve
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        print(f"FlatZinc cache: {self.hits}/{lookups} hits ({rate:.0%}), {self.saved:.2f}s of flattening saved")
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": rate, "saved": self.saved}
+
+def format_output(executable: str, ozn: Path, raw: str) -> str:
+    """Raw FlatZinc solver output through the model's output item"""
+    return subprocess.run([executable, "--ozn-file", str(ozn)], input=raw, capture_output=True, text=True).stdout
+
+def raw_objective(raw: str):
+    match = re.search(r"^_objective = (-?\d+);", raw, re.MULTILINE)
+    return int(match.group(1)) if match else None
+
+def parse_output(raw: str, text: str) -> minizinc.Result:
+    """Status from the solver's FlatZinc markers, solution from the last block of the formatted output.
+    A run cut off at the time limit after a solution is SATISFIED, as in anytime.stream_solve."""
+    if "=====UNSATISFIABLE=====" in raw:
+        return minizinc.Result(minizinc.Status.UNSATISFIABLE, None, {})
+    blocks = [block.strip() for block in text.split("----------")[:-1]]
+    if not blocks:
+        return minizinc.Result(minizinc.Status.UNKNOWN, None, {})
+    status = minizinc.Status.OPTIMAL_SOLUTION if "==========" in raw else minizinc.Status.SATISFIED
+    return minizinc.Result(status, blocks[-1], {})
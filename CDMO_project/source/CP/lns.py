@@ -0,0 +1,203 @@
+# lns.py
+import minizinc
+import json
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MIP"))
+from utils.symmetry import round_robin_weeks
+from utils.bounds import cp_lower_bound
+from tuning import load_config, apply_config
+
+# Large neighbourhood search around the MiniZinc models, for n past what complete
+# search reaches. Each round keeps most of the incumbent (home[w,p]/away[w,p] fixed)
+# and re-solves the rest with a short timeout:
+#   weeks   - a window of consecutive weeks is free
+#   periods - all weeks of a few periods are free
+# The base instance is set up once; rounds are branches of it (Instance.branch),
+# which reuse its parsed interface and data and only add the fixing constraints.
+# simple_CP.mzn repairs a schedule that breaks the period limit (feasibility);
+# phase2_optimize.mzn improves total_imbalance below the incumbent's.
+
+MODEL_DIR = Path(__file__).resolve().parent
+
+def pattern_schedule(n):
+    """round_robin_weeks with the k-th pair of every week in period k: a valid
+    round robin that breaks only the at-most-twice-per-period limit"""
+    weeks = round_robin_weeks(n)
+    return [[list(weeks[w][p]) for w in range(n - 1)] for p in range(n // 2)]
+
+def canonical(schedule, n):
+    """Relabel teams and reorder weeks so the schedule meets the symmetry breaking of
+    simple_CP.mzn: week 1 plays (1,2), (3,4), ... in periods 1, 2, ..., home < away,
+    and the period 1 home team never decreases from one week to the next"""
+    P, W = len(schedule), len(schedule[0])
+    label = {}
+    for p in range(P):
+        a, b = sorted(schedule[p][0])
+        label[a], label[b] = 2 * p + 1, 2 * p + 2
+    weeks = [[sorted((label[a], label[b])) for a, b in (schedule[p][w] for p in range(P))] for w in range(W)]
+    weeks = weeks[:1] + sorted(weeks[1:], key=lambda week: week[0][0])
+    return [[weeks[w][p] for w in range(W)] for p in range(P)]
+
+def period_violations(schedule, n):
+    """Slots (w, p) holding a team that plays more than twice in period p"""
+    slots = []
+    for p, row in enumerate(schedule):
+        count = {}
+        for match in row:
+            for t in match:
+                count[t] = count.get(t, 0) + 1
+        slots.extend((w, p) for w, match in enumerate(row) if any(count[t] > 2 for t in match))
+    return slots
+
+def imbalance(schedule):
+    """sum over teams of |home games - away games|, the phase2_optimize.mzn objective"""
+    balance = {}
+    for row in schedule:
+        for h, a in row:
+            balance[h] = balance.get(h, 0) + 1
+            balance[a] = balance.get(a, 0) - 1
+    return sum(abs(b) for b in balance.values())
+
+class LNS:
+    def __init__(self, model_file, n, solver_name="gecode", data=None, objective=None, round_timeout=10, seed=0):
+        # objective: name of the model's objective variable (None for feasibility)
+        self.n = n
+        self.P, self.W = n // 2, n - 1
+        self.solver_name = solver_name
+        self.objective = objective
+        self.round_timeout = round_timeout
+        self.rng = random.Random(seed)
+        self.base = minizinc.Instance(minizinc.Solver.lookup(solver_name), minizinc.Model(str(MODEL_DIR / model_file)))
+        for key, value in (data or {"n": n}).items():
+            self.base[key] = value
+        self.options = apply_config(self.base, load_config(model_file, solver_name))
+        self.rounds = 0
+
+    def neighbourhood(self, kind, window, schedule):
+        """Free slots. In feasibility mode every slot that breaks the period limit is
+        free as well (fixing it would make the round infeasible)."""
+        focus = period_violations(schedule, self.n) if self.objective is None else []
+        if kind == "weeks":
+            start = self.rng.randrange(self.W)
+            weeks = {(start + k) % self.W for k in range(min(window, self.W))}
+            free = {(w, p) for w in weeks for p in range(self.P)}
+        else:
+            periods = set(self.rng.sample(range(self.P), min(window, self.P)))
+            free = {(w, p) for w in range(self.W) for p in periods}
+        return free | set(focus)
+
+    def solve_round(self, schedule, free, bound, timeout):
+        """Re-solve the free slots of schedule, with the objective below bound if given"""
+        kept = [f"home[{w + 1},{p + 1}] = {schedule[p][w][0]} /\\ away[{w + 1},{p + 1}] = {schedule[p][w][1]}"
+                for p in range(self.P) for w in range(self.W) if (w, p) not in free]
+        self.rounds += 1
+        with self.base.branch() as child:
+            if kept:
+                child.add_string("constraint " + " /\\ ".join(kept) + ";\n")
+            if bound is not None:
+                child.add_string(f"constraint {self.objective} < {bound};\n")
+            result = child.solve(timeout=timedelta(seconds=timeout), **self.options)
+        if result.status.has_solution():
+            return eval(str(result.solution)), result.status
+        return None, result.status
+
+    def run(self, schedule, time_limit=300, kinds=("weeks", "periods"), window=2, target=None):
+        """Improve (or repair) schedule until target, a proof or the time limit.
+        Returns a res/CP entry with the anytime curve of the incumbent."""
+        start = time.time()
+        best = imbalance(schedule) if self.objective else None
+        feasible = self.objective is not None
+        curve = [(0.0, best)] if feasible else []
+        size, turn = window, 0
+        while time.time() - start < time_limit:
+            if feasible and target is not None and best <= target:
+                break
+            kind = kinds[turn % len(kinds)]
+            turn += 1
+            free = self.neighbourhood(kind, size, schedule)
+            timeout = min(self.round_timeout, time_limit - (time.time() - start))
+            found, status = self.solve_round(schedule, free, best, max(1, timeout))
+            if found is not None:
+                schedule, feasible = found, True
+                if self.objective is None:
+                    curve.append((round(time.time() - start, 3), None))
+                    break
+                best = imbalance(schedule)
+                curve.append((round(time.time() - start, 3), best))
+                size = window
+            else:
+                # proved or timed out without an improvement: widen the neighbourhood
+                limit = self.W if kind == "weeks" else self.P
+                size = size + 1 if size < limit else window
+        # repair is done once feasible; optimization once the incumbent reaches target
+        reached = self.objective is not None and target is not None and best <= target
+        done = feasible and (self.objective is None or reached)
+        return {
+            "time": int(min(time.time() - start, time_limit)) if done else time_limit,
+            "optimal": reached,
+            "obj": best,
+            "sol": schedule if feasible else None,
+            "curve": [list(point) for point in curve],
+            "rounds": self.rounds
+        }
+
+def repair(n, solver_name="gecode", time_limit=300, round_timeout=10, seed=0, schedule=None):
+    """Feasible schedule from schedule (default: pattern_schedule) through simple_CP.mzn"""
+    schedule = canonical(schedule or pattern_schedule(n), n)
+    if not period_violations(schedule, n):
+        return {"time": 0, "optimal": False, "obj": None, "sol": schedule, "curve": [[0.0, None]], "rounds": 0}
+    return LNS("simple_CP.mzn", n, solver_name, round_timeout=round_timeout, seed=seed).run(schedule, time_limit)
+
+def optimize(n, schedule, solver_name="gecode", time_limit=300, round_timeout=10, seed=0):
+    """Lower total_imbalance of a feasible schedule through phase2_optimize.mzn"""
+    data = {"n": n, "initial_solution": schedule, "imbalance_lb": cp_lower_bound(n)}
+    search = LNS("phase2_optimize.mzn", n, solver_name, data, "total_imbalance", round_timeout, seed)
+    return search.run(schedule, time_limit, target=cp_lower_bound(n))
+
+def solve(n, solver_name="gecode", time_limit=300, round_timeout=10, seed=0):
+    """Repair pattern_schedule, then optimize the repaired schedule, within time_limit overall"""
+    start = time.time()
+    fixed = repair(n, solver_name, time_limit, round_timeout, seed)
+    if fixed["sol"] is None:
+        return fixed
+    schedule, offset = fixed["sol"], time.time() - start
+    result = optimize(n, schedule, solver_name, max(1, time_limit - offset), round_timeout, seed)
+    result["curve"] = [[round(t + offset, 3), obj] for t, obj in result["curve"]]
+    result["rounds"] += fixed["rounds"]
+    if result["optimal"]:
+        result["time"] = int(min(time.time() - start, time_limit))
+    return result
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="LNS over the MiniZinc models, results merged into res/CP")
+    parser.add_argument("--teams", default="20,22,24", help="comma separated list of n")
+    parser.add_argument("--solver", default="gecode")
+    parser.add_argument("--timeout", type=int, default=300)
+    parser.add_argument("--round-timeout", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    output_dir = Path("res/CP")
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for n in [int(t) for t in args.teams.split(",")]:
+        print(f"\n=== LNS n = {n} with {args.solver} ===")
+        result = solve(n, args.solver, args.timeout, args.round_timeout, args.seed)
+        print(f"obj={result['obj']} optimal={result['optimal']} rounds={result['rounds']}")
+        if result["sol"] is None:
+            continue
+        output_file = output_dir / f"{n}.json"
+        results = json.loads(output_file.read_text()) if output_file.exists() else {}
+        results[f"{args.solver}_lns"] = result
+        with open(output_file, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results for n={n} saved to {output_file}")
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,52 @@
 import minizinc
+import asyncio
 import json
 import time
 from datetime import timedelta
 from pathlib import Path
+from fzn_cache import FznCache
+from anytime import stream_solve, stream_solve_async, incumbent_path, time_to_target
+from tuning import load_config, apply_config, model_data, solver_flags
 
-def run_solver(model_file: str, n: int, solver_name: str, time_limit: int = 300) -> dict:
-    """Run MiniZinc model using the specified solver and return results."""
-    
-    # Load the model
-    model = minizinc.Model(model_file)
-    
-    # Configure solver
-    solver = minizinc.Solver.lookup(solver_name)
-    instance = minizinc.Instance(solver, model)
+# simple: home/away per slot; compact: one match index per slot (alldifferent + global_cardinality)
+MODELS = {
+    "simple": "source/CP/simple_CP.mzn",
+    "compact": "source/CP/compact_CP.mzn",
+}
+
+def run_solver(model_file: str, n: int, solver_name: str, time_limit: int = 300, cache: FznCache = None) -> dict:
+    """Run MiniZinc model using the specified solver and return results.
+    With a cache, the FlatZinc compiled for the solver's library is reused.
+    Solutions are streamed: the latest one is kept in cache/incumbents while the
+    solver runs, and the entry records the anytime curve.
+    The solver's tuned search config (tuning.py) is applied when there is one."""
     
-    # Set parameters
-    instance["n"] = n  # Pass parameter 'n' to the model
+    incumbent = incumbent_path(Path(model_file).stem, n, solver_name)
+    config = load_config(model_file, solver_name)
     
+    # Solve with a time limit 
+    start_time = time.time()
     try:
-        # Solve with a time limit 
-        start_time = time.time()
-        result = instance.solve(timeout=timedelta(seconds=time_limit))
+        if cache is not None:
+            result, curve = cache.solve(model_file, {"n": n, **model_data(config)}, solver_name, time_limit, incumbent,
+                                        flags=solver_flags(config))
+        else:
+            # Load the model
+            model = minizinc.Model(model_file)
+            
+            # Configure solver
+            solver = minizinc.Solver.lookup(solver_name)
+            instance = minizinc.Instance(solver, model)
+            
+            # Set parameters
+            instance["n"] = n  # Pass parameter 'n' to the model
+            result, curve = stream_solve(instance, solver, time_limit, incumbent, **apply_config(instance, config))
         elapsed = time.time() - start_time
         
-        # Check solution status
-        if result.status == minizinc.Status.UNSATISFIABLE:
-            status = "unsatisfiable"
-            optimal = True
-            obj = None
-            sol = None
-        elif result.status == minizinc.Status.UNKNOWN:
-            status = "unknown"
-            optimal = False
-            obj = None
-            sol = None
-        elif result.status == minizinc.Status.OPTIMAL_SOLUTION:
-            status = "optimal"
-            optimal = True
-            obj = result.objective if hasattr(result, "objective") else None
-            sol_str = str(result.solution) if hasattr(result, "solution") else None
-            sol = eval(sol_str) if sol_str else None  # Simple conversion from string to list
-        else:  # SATISFIED or other status
-            status = "satisfiable"
-            optimal = False  # Not necessarily optimal
-            obj = result.objective if hasattr(result, "objective") else None
-            sol_str = str(result.solution) if hasattr(result, "solution") else None
-            sol = eval(sol_str) if sol_str else None  # Simple conversion from string to list
-        
-        return {
-            "time": int(min(elapsed, time_limit)),
-            "optimal": optimal,
-            "obj": obj,
-            "sol": sol,  # Now properly formatted as list
-        }
+        return result_to_dict(result, elapsed, time_limit, curve)
     
     except minizinc.MiniZincError as e:
+        elapsed = time.time() - start_time
         return {
             "solver": solver_name,
             "n": n,
@@ -66,11 +58,123 @@ def run_solver(model_file: str, n: int, solver_name: str, time_limit: int = 300)
             "error": str(e),
         }
 
-def main():
+def result_to_dict(result, elapsed: float, time_limit: int = 300, curve=None, target=None) -> dict:
+    """Turn a minizinc.Result into the res/CP entry.
+    curve: anytime (seconds, objective) pairs; time_to_target is when it first reaches target
+    (the first solution if target is None)."""
+    # Check solution status
+    if result.status == minizinc.Status.UNSATISFIABLE:
+        status = "unsatisfiable"
+        optimal = True
+        obj = None
+        sol = None
+    elif result.status == minizinc.Status.UNKNOWN:
+        status = "unknown"
+        optimal = False
+        obj = None
+        sol = None
+    elif result.status == minizinc.Status.OPTIMAL_SOLUTION:
+        status = "optimal"
+        optimal = True
+        obj = result.objective if hasattr(result, "objective") else None
+        sol_str = str(result.solution) if hasattr(result, "solution") else None
+        sol = eval(sol_str) if sol_str else None  # Simple conversion from string to list
+    else:  # SATISFIED or other status
+        status = "satisfiable"
+        optimal = False  # Not necessarily optimal
+        obj = result.objective if hasattr(result, "objective") else None
+        sol_str = str(result.solution) if hasattr(result, "solution") else None
+        sol = eval(sol_str) if sol_str else None  # Simple conversion from string to list
+    
+    return {
+        "time": int(min(elapsed, time_limit)),
+        "optimal": optimal,
+        "obj": obj,
+        "sol": sol,  # Now properly formatted as list
+        "curve": [list(point) for point in curve or []],
+        "time_to_target": time_to_target(curve or [], target),
+    }
+
+async def solve_async(model_file: str, n: int, solver_name: str, time_limit: int, limit: asyncio.Semaphore) -> tuple:
+    """run_solver on the asyncio API, holding one of the race's slots while the solver runs."""
+    async with limit:
+        solver = minizinc.Solver.lookup(solver_name)
+        instance = minizinc.Instance(solver, minizinc.Model(model_file))
+        instance["n"] = n
+        options = apply_config(instance, load_config(model_file, solver_name))
+        start_time = time.time()
+        try:
+            result, curve = await stream_solve_async(instance, solver, time_limit, incumbent_path(Path(model_file).stem, n, solver_name), **options)
+        except minizinc.MiniZincError as e:
+            print(f"  {solver_name} failed: {e}")
+            return solver_name, {"time": time_limit, "optimal": False, "obj": None, "sol": None}
+        return solver_name, result_to_dict(result, time.time() - start_time, time_limit, curve)
+
+async def race_solvers(model_file: str, n: int, solvers, time_limit: int = 300, concurrency: int = None, collect_all: bool = False) -> dict:
+    """Run the solvers concurrently, at most `concurrency` at a time (default: all of them).
+    The first solver with a solution (or a proof of unsatisfiability) wins and the rest are cancelled,
+    unless collect_all is set. Returns {solver: result} for the solvers that finished."""
+    limit = asyncio.Semaphore(concurrency or len(solvers))
+    tasks = [asyncio.create_task(solve_async(model_file, n, solver, time_limit, limit)) for solver in solvers]
+    results = {}
+    try:
+        for done in asyncio.as_completed(tasks):
+            solver, result = await done
+            results[solver] = result
+            print(f"  {solver} finished in {result['time']}s")
+            if not collect_all and (result["sol"] is not None or result["optimal"]):
+                break
+    finally:
+        # cancelling a task terminates its MiniZinc process
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return results
+
+def flatten_stats(model_file: str, n: int, solver_name: str, time_limit: int = 300) -> dict:
+    """Compile the model to FlatZinc for the solver and return flatten time and FlatZinc size."""
+    model = minizinc.Model(model_file)
+    solver = minizinc.Solver.lookup(solver_name)
+    instance = minizinc.Instance(solver, model)
+    instance["n"] = n
+    start_time = time.time()
+    with instance.flat(time_limit=timedelta(seconds=time_limit)) as (fzn, ozn, statistics):
+        elapsed = time.time() - start_time
+        fzn_bytes = Path(fzn.name).stat().st_size
+    return {
+        "flatten_time": round(elapsed, 2),
+        "fzn_bytes": fzn_bytes,
+        "vars": int(statistics.get("flatIntVars", 0)) + int(statistics.get("flatBoolVars", 0)),
+        "constraints": int(statistics.get("flatIntConstraints", 0)) + int(statistics.get("flatBoolConstraints", 0)),
+    }
+
+def compare_models(n_values, solvers, models=("simple", "compact"), time_limit: int = 300) -> list:
+    """Flatten time, FlatZinc size and solve time of each model for each solver and n."""
+    rows = []
+    for n in n_values:
+        for solver in solvers:
+            for name in models:
+                try:
+                    stats = flatten_stats(MODELS[name], n, solver, time_limit)
+                except minizinc.MiniZincError as e:
+                    print(f"n={n} solver={solver} model={name} flatten error: {e}")
+                    continue
+                result = run_solver(MODELS[name], n, solver, time_limit)
+                row = {"n": n, "solver": solver, "model": name, **stats,
+                       "solve_time": result["time"], "solved": result["sol"] is not None}
+                rows.append(row)
+                print(f"n={n} solver={solver} model={name} flatten={stats['flatten_time']}s "
+                      f"fzn={stats['fzn_bytes'] // 1024}KiB vars={stats['vars']} constraints={stats['constraints']} "
+                      f"solve={result['time']}s solved={row['solved']}")
+    return rows
+
+def main(model: str = "simple", use_cache: bool = True, race: bool = False, concurrency: int = None, collect_all: bool = False):
+    # race: run the solvers concurrently per n (race_solvers) instead of one after another
     # Test n values from 6 to 16 (inclusive)
     n_values = [6 ,8 ,10, 12, 14]
     
     solvers = ['gecode', 'chuffed', 'coin-bc', 'cp-sat', 'highs']
+    cache = FznCache() if use_cache else None
     
     # Create output directory
     output_dir = Path("res/CP")
@@ -81,13 +185,19 @@ def main():
         print(f"\n=== Testing n = {n} ===")
         results = {}
         
-        for solver in solvers:
-            print(f"Running with {solver}...")
-            result = run_solver("source/CP/simple_CP.mzn", n, solver)
-            
+        if race:
+            print(f"Racing {', '.join(solvers)}...")
+            runs = asyncio.run(race_solvers(MODELS[model], n, solvers, concurrency=concurrency, collect_all=collect_all))
+        else:
+            runs = {}
+            for solver in solvers:
+                print(f"Running with {solver}...")
+                runs[solver] = run_solver(MODELS[model], n, solver, cache=cache)
+        
+        for solver, result in runs.items():
             # Filter out results with sol=null or time > 300
             if result["sol"] is not None and result["time"] <= 300:
-                results[solver] = result
+                results[solver if model == "simple" else f"{solver}_{model}"] = result
             else:
                 print(f"  Skipping {solver} - no solution found or timeout exceeded")
         
@@ -95,12 +205,33 @@ def main():
         if results:
             # Save to JSON file for this n value
             output_file = output_dir / f"{n}.json"
+            if model != "simple" and output_file.exists():
+                # keep the simple model's entries next to this model's
+                with open(output_file) as f:
+                    results = {**json.load(f), **results}
             with open(output_file, "w") as f:
                 json.dump(results, f, indent=2)
             
             print(f"Results for n={n} saved to {output_file}")
         else:
             print(f"No valid results for n={n}, skipping file creation")
+    
+    if cache is not None:
+        cache.report()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Solve STS instances with MiniZinc and save them to res/CP")
+    parser.add_argument("--model", default="simple", choices=sorted(MODELS))
+    parser.add_argument("--compare", action="store_true", help="report flatten time, FlatZinc size and solve time of every model")
+    parser.add_argument("--teams", default="6,8,10,12,14", help="comma separated list of n for --compare")
+    parser.add_argument("--solvers", default="gecode,chuffed,coin-bc,cp-sat,highs", help="comma separated solvers for --compare")
+    parser.add_argument("--no-cache", action="store_true", help="flatten every (n, solver) pair again instead of using cache/fzn")
+    parser.add_argument("--race", action="store_true", help="run the solvers concurrently and stop at the first answer")
+    parser.add_argument("--concurrency", type=int, default=None, help="solvers running at once with --race (default: all)")
+    parser.add_argument("--collect-all", action="store_true", help="with --race, wait for every solver and save all their times")
+    args = parser.parse_args()
+    if args.compare:
+        compare_models([int(t) for t in args.teams.split(",")], args.solvers.split(","))
+    else:
+        main(args.model, not args.no_cache, args.race, args.concurrency, args.collect_all)
\ No newline at end of file
@@ -1,23 +1,56 @@
 # run_2phase_solver.py
 import minizinc
 import json
+import os
+import sys
 import time
 from datetime import timedelta
 from pathlib import Path
+from fzn_cache import FznCache
+from anytime import stream_solve, incumbent_path, time_to_target
+from tuning import load_config, apply_config, model_data, solver_flags
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MIP"))
+from utils.orientation import orient
+from utils.bounds import cp_lower_bound, reaches_bound
 
 class STSTwoPhaseSolver:
-    def __init__(self, n_teams, solver_name="gecode", timeout=300):
+    def __init__(self, n_teams, solver_name="gecode", timeout=300, phase2_method="minizinc", cache=None):
         self.n_teams = n_teams
         self.solver_name = solver_name
         self.timeout = timeout
+        # FznCache shared between runs, or None to flatten every model again
+        self.cache = cache
+        # "minizinc": phase2_optimize.mzn, "euler": closed-form orientation from utils.orientation
+        self.phase2_method = phase2_method
         self.phase1_solution = None
         self.phase2_solution = None
         self.phase1_time = 0
         self.phase2_time = 0
+        # anytime curve over both phases: (seconds since the start of phase 1, imbalance)
+        self.curve = []
     
-    def run_minizinc_model(self, model_file, data_dict=None):
-        """Run MiniZinc model and return results"""
+    def run_minizinc_model(self, model_file, data_dict=None, offset=0.0, use_cache=True):
+        """Run MiniZinc model and return results.
+        Solutions are streamed (see anytime.py); "curve" holds their times, shifted by offset.
+        use_cache=False skips the FlatZinc cache for data that never repeats."""
+        incumbent = incumbent_path(f"2phase_{Path(model_file).stem}", self.n_teams, self.solver_name)
+        # tuned search config of this model and solver (tuning.py), if any
+        config = load_config(model_file, self.solver_name)
         try:
+            if self.cache is not None and use_cache:
+                start_time = time.time()
+                result, curve = self.cache.solve(model_file, {**(data_dict or {}), **model_data(config)}, self.solver_name,
+                                                 self.timeout, incumbent, offset, flags=solver_flags(config))
+                elapsed = time.time() - start_time
+                return {
+                    "result": result,
+                    "elapsed": min(elapsed, self.timeout),
+                    "status": result.status,
+                    "curve": curve,
+                    "solver": self.solver_name
+                }
+
             # Load the model
             model = minizinc.Model(model_file)
             
@@ -32,13 +65,14 @@ class STSTwoPhaseSolver:
             
             # Solve with time limit
             start_time = time.time()
-            result = instance.solve(timeout=timedelta(seconds=self.timeout))
+            result, curve = stream_solve(instance, solver, self.timeout, incumbent, offset, **apply_config(instance, config))
             elapsed = time.time() - start_time
             
             return {
                 "result": result,
                 "elapsed": min(elapsed, self.timeout),
                 "status": result.status,
+                "curve": curve,
                 "solver": self.solver_name
             }
             
@@ -48,6 +82,7 @@ class STSTwoPhaseSolver:
                 "result": None,
                 "elapsed": self.timeout,
                 "status": minizinc.Status.ERROR,
+                "curve": [],
                 "error": str(e),
                 "solver": self.solver_name
             }
@@ -153,6 +188,7 @@ class STSTwoPhaseSolver:
                     "solver": self.solver_name,
                     "imbalance": self.calculate_imbalance(solution)
                 }
+                self.curve = [(round(self.phase1_time, 3), self.phase1_solution["imbalance"])]
                 print(f"Phase 1 completed successfully in {self.phase1_time:.3f} seconds with {self.solver_name}!")
                 print(f"Initial imbalance: {self.phase1_solution['imbalance']}")
                 return True
@@ -166,18 +202,24 @@ class STSTwoPhaseSolver:
             print("Run phase 1 first!")
             return False
         
+        if self.phase2_method == "euler":
+            return self.run_phase2_euler()
+
         print(f"Running phase 2 optimization for n={self.n_teams} with {self.solver_name}...")
         phase2_start = time.time()
         
         # Prepare data for phase 2 - use the 3D array format
         data = {
             "n": self.n_teams,
-            "initial_solution": self.phase1_solution["solution"]
+            "initial_solution": self.phase1_solution["solution"],
+            "imbalance_lb": cp_lower_bound(self.n_teams)
         }
         
-        result_info = self.run_minizinc_model("phase2_optimize.mzn", data)
+        # the data is the phase 1 schedule, so a cached compilation would never be reused
+        result_info = self.run_minizinc_model("phase2_optimize.mzn", data, offset=self.phase1_time, use_cache=False)
         
         self.phase2_time = time.time() - phase2_start
+        self.curve += result_info["curve"]
         
         if result_info["result"] and result_info["status"] in [
             minizinc.Status.SATISFIED, 
@@ -191,14 +233,41 @@ class STSTwoPhaseSolver:
                     "solution": solution,
                     "elapsed": self.phase2_time,
                     "solver": self.solver_name,
-                    "imbalance": imbalance
+                    "imbalance": imbalance,
+                    "optimal": result_info["status"] == minizinc.Status.OPTIMAL_SOLUTION or reaches_bound(imbalance, self.n_teams, "cp")
                 }
                 print(f"Phase 2 completed in {self.phase2_time:.3f} seconds with {self.solver_name}! Final imbalance: {imbalance}")
                 return True
         
-        print(f"Phase 2 failed with {self.solver_name}")
+        # Keep the phase 1 schedule, so a run whose phase 2 times out still yields one
+        imbalance = self.phase1_solution["imbalance"]
+        self.phase2_solution = {
+            "solution": self.phase1_solution["solution"],
+            "elapsed": self.phase2_time,
+            "solver": self.solver_name,
+            "imbalance": imbalance,
+            "optimal": reaches_bound(imbalance, self.n_teams, "cp")
+        }
+        print(f"Phase 2 failed with {self.solver_name}, keeping the phase 1 schedule")
         return False
     
+    def run_phase2_euler(self):
+        """Phase 2 without a solver: weeks and periods stay, every match gets the optimal orientation"""
+        phase2_start = time.time()
+        solution = orient(self.phase1_solution["solution"], self.n_teams)
+        self.phase2_time = time.time() - phase2_start
+        imbalance = self.calculate_imbalance(solution)
+        self.phase2_solution = {
+            "solution": solution,
+            "elapsed": self.phase2_time,
+            "solver": self.solver_name,
+            "imbalance": imbalance,
+            "optimal": reaches_bound(imbalance, self.n_teams, "cp")
+        }
+        self.curve.append((round(self.get_total_time(), 3), imbalance))
+        print(f"Phase 2 (euler) completed in {self.phase2_time:.3f} seconds! Final imbalance: {imbalance}")
+        return True
+
     def get_total_time(self):
         """Get the total time for both phases"""
         return self.phase1_time + self.phase2_time
@@ -219,23 +288,24 @@ class STSTwoPhaseSolver:
         # Create the result entry
         result_dict = {
             "time": runtime,
-            "optimal": True,
+            "optimal": self.phase2_solution["optimal"],
             "obj": int(self.phase2_solution["imbalance"]),
-            "sol": solution_data
+            "sol": solution_data,
+            "curve": [list(point) for point in self.curve],
+            "time_to_target": time_to_target(self.curve, cp_lower_bound(self.n_teams))
         }
 
         return result_dict
 
-def run_solver(model_file: str, n: int, solver_name: str, time_limit: int = 300) -> dict:
+def run_solver(model_file: str, n: int, solver_name: str, time_limit: int = 300, phase2_method: str = "minizinc", cache=None) -> dict:
     """Run two-phase solver and return results in the same format as the first code"""
     print(f"Running two-phase solver for n={n} with {solver_name}...")
     
-    solver = STSTwoPhaseSolver(n, solver_name, time_limit)
+    solver = STSTwoPhaseSolver(n, solver_name, time_limit, phase2_method, cache)
     
-    # Run both phases
-    success = solver.run_phase1() and solver.run_phase2()
-    
-    if success:
+    # Run both phases; a failed phase 2 still leaves the phase 1 schedule
+    if solver.run_phase1():
+        solver.run_phase2()
         result_dict = solver.get_result_dict()
         if result_dict and result_dict["sol"] is not None and result_dict["time"] <= time_limit:
             return result_dict
@@ -254,6 +324,7 @@ def main():
     n_values = [6, 8, 10, 12, 14]
     
     solvers = ['gecode', 'chuffed', 'coin-bc', 'cp-sat', 'highs']
+    cache = FznCache()
     
     # Create output directory
     output_dir = Path("res/CP")
@@ -274,7 +345,7 @@ def main():
             
                 
             print(f"Running with {solver}...")
-            result = run_solver("simple_CP.mzn", n, solver)
+            result = run_solver("simple_CP.mzn", n, solver, cache=cache)
             
             # Filter out results with sol=null or time > 300
             if result["sol"] is not None and result["time"] <= 300:
@@ -288,5 +359,7 @@ def main():
         
         print(f"Results for n={n} saved to {output_file}")
 
+    cache.report()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
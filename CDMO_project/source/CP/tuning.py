@@ -0,0 +1,163 @@
+# tuning.py
+import minizinc
+import itertools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from anytime import stream_solve
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MIP"))
+from utils.bounds import cp_lower_bound
+
+# Search and solver parameters of the CP models, tuned per solver.
+# The models read var_select / val_select / restart (defaults in the .mzn files);
+# a config overrides them as data, which needs --allow-multiple-assignments.
+# free_search, processes and random_seed are solver flags (-f, -p, -r) and are
+# only tried where the solver lists them in stdFlags.
+# The runners load CONFIG_FILE automatically: {model: {solver: config}}.
+
+CONFIG_FILE = Path(__file__).resolve().parent / "tuned_config.json"
+
+SEARCH_SPACE = {
+    "var_select": (1, 2, 3),    # input_order, first_fail, dom_w_deg
+    "val_select": (1, 2, 3),    # indomain_min, indomain_random, indomain_split
+    "restart": (0, 1, 2),       # none, luby, geometric
+}
+DEFAULTS = {
+    "simple_CP": {"var_select": 1, "val_select": 1, "restart": 0},
+    "compact_CP": {"var_select": 1, "val_select": 1, "restart": 0},
+    "phase2_optimize": {"var_select": 3, "val_select": 1, "restart": 0},
+}
+
+def load_config(model_file, solver_name, path=CONFIG_FILE):
+    """Tuned config of the model for the solver ({} if there is none)"""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    try:
+        configs = json.loads(path.read_text())
+    except json.JSONDecodeError:
+        return {}
+    return configs.get(Path(model_file).stem, {}).get(solver_name, {})
+
+def model_data(config):
+    return {key: config[key] for key in SEARCH_SPACE if key in config}
+
+def solve_options(config):
+    """Keyword arguments of Instance.solve / Instance.solutions"""
+    options = {key: config[key] for key in ("free_search", "processes", "random_seed") if config.get(key) is not None}
+    if model_data(config):
+        options["allow-multiple-assignments"] = True
+    return options
+
+def solver_flags(config):
+    """The same options on the minizinc command line (for FznCache)"""
+    flags = ["--free-search"] if config.get("free_search") else []
+    if config.get("processes") is not None:
+        flags += ["--parallel", str(config["processes"])]
+    if config.get("random_seed") is not None:
+        flags += ["--random-seed", str(config["random_seed"])]
+    return flags
+
+def apply_config(instance, config):
+    """Set the config's model parameters on instance and return its solve options"""
+    for key, value in model_data(config).items():
+        instance[key] = value
+    return solve_options(config)
+
+def candidate_configs(model_file, solver, threads=(1, 2, 4), seeds=(0, 1)):
+    """The model's defaults first, then the whole grid the solver supports"""
+    flags = solver.stdFlags
+    default = dict(DEFAULTS.get(Path(model_file).stem, {}))
+    yield default
+    options = {
+        "free_search": (False, True) if "-f" in flags else (False,),
+        "processes": threads if "-p" in flags else (None,),
+        "random_seed": seeds if "-r" in flags else (None,),
+    }
+    keys = list(SEARCH_SPACE) + list(options)
+    for values in itertools.product(*SEARCH_SPACE.values(), *options.values()):
+        config = {key: value for key, value in zip(keys, values) if value is not None and value is not False}
+        if config != default:
+            yield config
+
+def instance_data(model_file, n):
+    if Path(model_file).stem == "phase2_optimize":
+        from lns import pattern_schedule
+        return {"n": n, "initial_solution": pattern_schedule(n), "imbalance_lb": cp_lower_bound(n)}
+    return {"n": n}
+
+def evaluate(model_file, n, solver_name, config, cap):
+    """PAR-2 score: seconds to a solution (satisfaction) or to a proven optimum, 2 * cap if not reached"""
+    solver = minizinc.Solver.lookup(solver_name)
+    instance = minizinc.Instance(solver, minizinc.Model(model_file))
+    for key, value in instance_data(model_file, n).items():
+        instance[key] = value
+    options = apply_config(instance, config)
+    start = time.time()
+    try:
+        result, _ = stream_solve(instance, solver, cap, **options)
+    except (minizinc.MiniZincError, NotImplementedError):
+        return 2 * cap
+    elapsed = time.time() - start
+    solved = result.status == minizinc.Status.OPTIMAL_SOLUTION or (result.status.has_solution() and result.objective is None)
+    return min(elapsed, cap) if solved else 2 * cap
+
+def race(model_file, solver_name, train_ns, budget=600, cap=60, margin=0.5, configs=None):
+    """Race the configs over train_ns (smallest first) within budget seconds. After each n
+    the configs whose total score is more than (1 + margin) * best + 1 s are dropped.
+    Returns (best config, {index: total score})."""
+    solver = minizinc.Solver.lookup(solver_name)
+    candidates = list(configs or candidate_configs(model_file, solver))
+    alive = list(range(len(candidates)))
+    scores = {i: 0.0 for i in alive}
+    runs = {i: 0 for i in alive}
+    deadline = time.time() + budget
+    for n in sorted(train_ns):
+        for i in alive:
+            remaining = deadline - time.time()
+            if remaining <= 1:
+                break
+            scores[i] += evaluate(model_file, n, solver_name, candidates[i], min(cap, remaining))
+            runs[i] += 1
+        # only configs that ran on the same instances are comparable
+        done = max(runs[i] for i in alive)
+        alive = [i for i in alive if runs[i] == done]
+        best = min(scores[i] for i in alive)
+        alive = [i for i in alive if scores[i] <= (1 + margin) * best + 1]
+        print(f"  {solver_name} n={n}: {len(alive)} configs left, best {best:.1f}s")
+        if len(alive) == 1 or time.time() >= deadline - 1:
+            break
+    winner = min(alive, key=lambda i: scores[i])
+    return candidates[winner], scores
+
+def tune(model_files, solvers, train_ns, budget=600, cap=60, path=CONFIG_FILE):
+    """Race every solver on every model and merge the winners into the config file"""
+    path = Path(path)
+    configs = json.loads(path.read_text()) if path.exists() else {}
+    for model_file in model_files:
+        for solver_name in solvers:
+            print(f"Tuning {Path(model_file).name} for {solver_name}...")
+            best, scores = race(model_file, solver_name, train_ns, budget, cap)
+            configs.setdefault(Path(model_file).stem, {})[solver_name] = best
+            print(f"  best: {best}")
+            path.write_text(json.dumps(configs, indent=2))
+    return configs
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Tune search annotations and solver flags of the CP models")
+    parser.add_argument("--models", default="source/CP/simple_CP.mzn,source/CP/phase2_optimize.mzn")
+    parser.add_argument("--solvers", default="gecode,chuffed,cp-sat")
+    parser.add_argument("--teams", default="6,8,10", help="training n values")
+    parser.add_argument("--budget", type=int, default=600, help="seconds per model and solver")
+    parser.add_argument("--cap", type=int, default=60, help="seconds per run")
+    args = parser.parse_args(argv)
+    tune(args.models.split(","), args.solvers.split(","), [int(t) for t in args.teams.split(",")], args.budget, args.cap)
+    print(f"Best configurations written to {CONFIG_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,165 @@
-import time, math, os, json
+import time, math, os, json, signal, queue
+import multiprocessing
 import pulp
 from pulp import PulpSolverError
-from utils.symmetry import round_robin_weeks
+from utils.symmetry import round_robin_weeks, check_sb, DEFAULT_SB
+from utils.orientation import orient, imbalance
+from utils.construct import construct_schedule, supported
+from utils.bounds import team_deviation_bound, reaches_bound
+from utils.warmstart import initial_schedule, valid_schedule, weeks_of, normalize
 
-def get_solver(name: str, msg: bool):
+def get_solver(name: str, msg: bool, warm_start: bool = False, threads: int = 1, orbital: bool = True):
     s = name.lower()
     if s == "highs":
-        return pulp.HiGHS_CMD(timeLimit=300, msg=msg, threads=1)
+        options = [] if orbital else ["mip_detect_symmetry=false"]
+        return pulp.HiGHS_CMD(timeLimit=300, msg=msg, threads=threads, warmStart=warm_start, options=options)
     if s == "cbc":
-        return pulp.PULP_CBC_CMD(timeLimit=300, msg=msg)
+        return pulp.PULP_CBC_CMD(timeLimit=300, msg=msg, warmStart=warm_start, threads=threads)
     raise ValueError("solver must be 'highs' or 'cbc'")
 
-def solve_tournament(n: int, verbose: bool = False, solver_name: str = "highs"):
+def solve_tournament(n: int, verbose: bool = False, solver_name: str = "highs", backend: str = "pulp", fairness: str = "mip", fallback: bool = True, initial=None, sb=DEFAULT_SB, formulation: str = "base"):
+    # fairness="mip": home/away variables in the model; "euler": schedule only, then utils.orientation
+    # fallback: report the utils.construct schedule (not optimal, time 300) if the solver finds nothing
+    # initial: MIP start schedule (periods x weeks), or "auto" for utils.warmstart.initial_schedule;
+    # the model then uses its weeks instead of round_robin_weeks
+    # sb: symmetry breaking layers, see utils.symmetry.SB_LAYERS
+    # formulation="tight": team-period occupancy variables and their valid equalities, see build_model
+    if fairness not in ("mip", "euler"):
+        raise ValueError("fairness must be 'mip' or 'euler'")
+    if formulation not in ("base", "tight"):
+        raise ValueError("formulation must be 'base' or 'tight'")
+    sb = check_sb(sb)
+    initial = prepare_initial(n, initial, sb)
+    if backend == "matrix":
+        if solver_name.lower() != "highs":
+            raise ValueError("the matrix backend only supports 'highs'")
+        try:
+            from utils.matrix import solve_matrix
+        except ImportError as e:
+            raise ImportError("the matrix backend needs numpy and highspy (pip install -r requirements.txt)") from e
+        return with_fallback(solve_matrix(n, verbose, fairness=fairness, initial=initial, sb=sb, formulation=formulation), n, fallback)
+    elif backend != "pulp":
+        raise ValueError("backend must be 'pulp' or 'matrix'")
+    model = build_model(n, fairness, initial, sb, formulation)
+    start = time.time()
+    try:
+        solver = get_solver(solver_name, verbose, bool(initial), orbital="orbital" in sb)
+        model["prob"].solve(solver)
+    except PulpSolverError:
+        solver = get_solver("cbc", verbose, bool(initial))
+        model["prob"].solve(solver)
+        solver_name = "cbc"
+    return with_fallback(read_result(model, n, solver_name, time.time() - start), n, fallback)
+
+def prepare_initial(n: int, initial, sb=DEFAULT_SB):
+    if isinstance(initial, str):
+        if initial != "auto":
+            raise ValueError("initial must be a schedule or 'auto'")
+        initial = initial_schedule(n)
+    if initial is not None:
+        if not valid_schedule(initial, n):
+            raise ValueError("initial schedule is not valid")
+        initial = normalize(initial, sb)
+    return initial
+
+def build_model(n: int, fairness: str = "mip", initial=None, sb=DEFAULT_SB, formulation: str = "base"):
     teams = list(range(1, n + 1))
     weeks = list(range(1, n))
     periods = list(range(1, n // 2 + 1))
-    week_pairs = round_robin_weeks(n)
+    week_pairs = weeks_of(initial) if initial else round_robin_weeks(n)
     prob = pulp.LpProblem("STS", pulp.LpMinimize)
     week_of, matches = {}, []
+    team_matches = {t: [] for t in teams}
     for w_idx, pairs in enumerate(week_pairs, start=1):
         for ij in pairs:
             i, j = ij
             week_of[(i, j)] = w_idx
             matches.append((i, j))
+            team_matches[i].append((i, j))
+            team_matches[j].append((i, j))
     y = pulp.LpVariable.dicts("y", [(i, j, p) for (i, j) in matches for p in periods], 0, 1, cat="Binary")
-    h = pulp.LpVariable.dicts("h", matches, 0, 1, cat="Binary")
-    home_count = pulp.LpVariable.dicts("home_count", teams, lowBound=0, upBound=len(weeks), cat="Continuous")
-    z_min = pulp.LpVariable("z_min", lowBound=0, cat="Continuous")
-    z_max = pulp.LpVariable("z_max", lowBound=0, upBound=len(weeks), cat="Continuous")
     for ij in matches:
         i, j = ij
         prob += pulp.lpSum(y[(i, j, p)] for p in periods) == 1
     for w in weeks:
         for p in periods:
             prob += pulp.lpSum(y[(i, j, p)] for (i, j) in week_pairs[w - 1]) == 1
-    for t in teams:
+    if formulation == "tight":
+        # A team plays n - 1 = 2|periods| - 1 games at most twice per period, so it plays
+        # exactly twice in every period but one (s = 1 there), and each period, with its
+        # 2(n - 1) slots, has exactly two such teams. The LP relaxation of "<= 2" misses both.
+        s = pulp.LpVariable.dicts("s", [(t, p) for t in teams for p in periods], 0, 1, cat="Binary")
+        for t in teams:
+            for p in periods:
+                prob += pulp.lpSum(y[(i, j, p)] for (i, j) in team_matches[t]) + s[(t, p)] == 2
+            prob += pulp.lpSum(s[(t, p)] for p in periods) == 1
         for p in periods:
-            prob += pulp.lpSum(y[(i, j, p)] for (i, j) in matches if i == t or j == t) <= 2
-    for i in teams:
-        left = pulp.lpSum(h[(i, j)] for (a, j) in matches if a == i)
-        right = pulp.lpSum(1 - h[(k, i)] for (k, b) in matches if b == i)
-        prob += home_count[i] == left + right
-        prob += z_max >= home_count[i]
-        prob += z_min <= home_count[i]
-    for ij in week_pairs[0]:
-        i, j = ij
-        if 1 in (i, j):
-            a, b = (i, j) if i < j else (j, i)
-            prob += y[(a, b, 1)] == 1
-            break
-    target = (n - 1) / 2.0
-    d_plus = pulp.LpVariable.dicts("d_plus", teams, lowBound=0, cat="Continuous")
-    d_minus = pulp.LpVariable.dicts("d_minus", teams, lowBound=0, cat="Continuous")
-    for i in teams:
-        prob += home_count[i] - target == d_plus[i] - d_minus[i]
-    prob += pulp.lpSum(d_plus[i] + d_minus[i] for i in teams)
-    start = time.time()
-    try:
-        solver = get_solver(solver_name, verbose)
-        prob.solve(solver)
-    except PulpSolverError:
-        solver = get_solver("cbc", verbose)
-        prob.solve(solver)
-        solver_name = "cbc"
-    wall = int(math.floor(time.time() - start))
+            prob += pulp.lpSum(s[(t, p)] for t in teams) == 2
+    else:
+        for t in teams:
+            for p in periods:
+                prob += pulp.lpSum(y[(i, j, p)] for (i, j) in team_matches[t]) <= 2
+    if "team1" in sb:
+        for ij in week_pairs[0]:
+            i, j = ij
+            if 1 in (i, j):
+                a, b = (i, j) if i < j else (j, i)
+                prob += y[(a, b, 1)] == 1
+                break
+    if "week1" in sb:
+        for p, (i, j) in zip(periods, week_pairs[0]):
+            prob += y[(i, j, p)] == 1
+    if fairness == "mip":
+        h = pulp.LpVariable.dicts("h", matches, 0, 1, cat="Binary")
+        home_count = pulp.LpVariable.dicts("home_count", teams, lowBound=0, upBound=len(weeks), cat="Continuous")
+        z_min = pulp.LpVariable("z_min", lowBound=0, cat="Continuous")
+        z_max = pulp.LpVariable("z_max", lowBound=0, upBound=len(weeks), cat="Continuous")
+        for i in teams:
+            left = pulp.lpSum(h[(a, b)] for (a, b) in team_matches[i] if a == i)
+            right = pulp.lpSum(1 - h[(a, b)] for (a, b) in team_matches[i] if b == i)
+            prob += home_count[i] == left + right
+            prob += z_max >= home_count[i]
+            prob += z_min <= home_count[i]
+        target = (n - 1) / 2.0
+        d_plus = pulp.LpVariable.dicts("d_plus", teams, lowBound=0, cat="Continuous")
+        d_minus = pulp.LpVariable.dicts("d_minus", teams, lowBound=0, cat="Continuous")
+        for i in teams:
+            prob += home_count[i] - target == d_plus[i] - d_minus[i]
+            # utils.bounds: lifts the dual bound to n/2, so the search ends with the first incumbent there
+            prob += d_plus[i] + d_minus[i] >= team_deviation_bound(n)
+        prob += pulp.lpSum(d_plus[i] + d_minus[i] for i in teams)
+        if "home" in sb:
+            prob += h[matches[0]] == 1
+    else:
+        prob += pulp.lpSum([])
+    if initial:
+        home = {t: 0 for t in teams}
+        for p, row in enumerate(initial, start=1):
+            for a, b in row:
+                i, j = min(a, b), max(a, b)
+                for q in periods:
+                    y[(i, j, q)].setInitialValue(int(q == p))
+                if fairness == "mip":
+                    h[(i, j)].setInitialValue(int(a == i))
+                home[a] += 1
+            if formulation == "tight":
+                for t in teams:
+                    s[(t, p)].setInitialValue(int(sum(t in ab for ab in row) == 1))
+        if fairness == "mip":
+            for i in teams:
+                home_count[i].setInitialValue(home[i])
+                d_plus[i].setInitialValue(max(0, home[i] - target))
+                d_minus[i].setInitialValue(max(0, target - home[i]))
+            z_min.setInitialValue(min(home.values()))
+            z_max.setInitialValue(max(home.values()))
+    return {"prob": prob, "y": y, "h": h if fairness == "mip" else None, "matches": matches, "week_of": week_of, "fairness": fairness}
+
+def read_result(model: dict, n: int, solver_name: str, elapsed: float):
+    prob, y, h, matches, week_of, fairness = (model[k] for k in ("prob", "y", "h", "matches", "week_of", "fairness"))
+    weeks = list(range(1, n))
+    periods = list(range(1, n // 2 + 1))
+    wall = int(math.floor(elapsed))
     status = pulp.LpStatus[prob.status]
-    optimal = prob.status == pulp.LpStatusOptimal
-    if not optimal:
-        wall = 300
     feasible = any((pulp.value(y[(i, j, p)]) or 0) > 0.5 for (i, j) in matches for p in periods)
     obj_val = int(round(pulp.value(prob.objective))) if pulp.value(prob.objective) is not None else None
     solution = []
@@ -82,11 +174,93 @@ def solve_tournament(n: int, verbose: bool = False, solver_name: str = "highs"):
                 if val > 0.5:
                     chosen = p
                     break
-            hij = int(round(pulp.value(h[(i, j)]) or 0))
+            hij = int(round(pulp.value(h[(i, j)]) or 0)) if fairness == "mip" else 1
             home, away = (i, j) if hij == 1 else (j, i)
             solution[chosen - 1][w - 1] = [home, away]
+        if fairness == "euler":
+            solution = orient(solution, n)
+            obj_val = imbalance(solution, n)
+    # an incumbent at the lower bound is optimal even if the solver stopped before proving it
+    optimal = prob.status == pulp.LpStatusOptimal or (feasible and reaches_bound(obj_val, n))
+    if not optimal:
+        wall = 300
     return {"time": wall, "optimal": optimal, "obj": obj_val, "sol": solution, "solver": solver_name, "status": status}
 
+def with_fallback(res: dict, n: int, fallback: bool):
+    if res["sol"] or not fallback or not supported(n):
+        return res
+    sol = construct_schedule(n)
+    res.update({"time": 300, "optimal": False, "obj": imbalance(sol, n), "sol": sol, "status": "Constructed"})
+    return res
+
+def race_worker(model: dict, n: int, name: str, verbose: bool, warm_start: bool, threads: int, orbital: bool, results):
+    # Own process group, so terminating the race also stops the solver binary
+    os.setsid()
+    start = time.time()
+    try:
+        model["prob"].solve(get_solver(name, verbose, warm_start, threads, orbital))
+    except PulpSolverError as e:
+        print(f"{name} failed: {e}")
+        results.put((name, None))
+        return
+    results.put((name, read_result(model, n, name, time.time() - start)))
+
+def race_tournament(n: int, solvers=("highs", "cbc"), threads=None, verbose: bool = False, fairness: str = "mip", initial=None, keep_all: bool = False, fallback: bool = True, sb=DEFAULT_SB, formulation: str = "base"):
+    # Build the PuLP model once and solve it on every solver at the same time (forked workers share the model).
+    # threads: {solver: threads}, default 1 each.
+    # keep_all=False: first proven optimum wins and the other solvers are stopped; otherwise, best objective.
+    # keep_all=True: wait for every solver and return {solver: result or None}.
+    threads = threads or {}
+    sb = check_sb(sb)
+    initial = prepare_initial(n, initial, sb)
+    model = build_model(n, fairness, initial, sb, formulation)
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    procs = {name: ctx.Process(target=race_worker, args=(model, n, name, verbose, bool(initial), threads.get(name, 1), "orbital" in sb, results), daemon=True) for name in solvers}
+    for proc in procs.values():
+        proc.start()
+    done = {}
+    deadline = time.time() + 300 + 30
+    try:
+        while len(done) < len(procs):
+            try:
+                name, res = results.get(timeout=max(1, deadline - time.time()))
+            except queue.Empty:
+                break
+            done[name] = res
+            if res and res["optimal"] and not keep_all:
+                break
+    finally:
+        for proc in procs.values():
+            if proc.is_alive():
+                try:
+                    os.killpg(proc.pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    proc.terminate()
+            proc.join()
+    if keep_all:
+        return {name: done.get(name) for name in solvers}
+    found = [res for res in done.values() if res and res["sol"]]
+    best = min(found, key=lambda res: (not res["optimal"], res["obj"]), default=None)
+    if best is None:
+        best = {"time": 300, "optimal": False, "obj": None, "sol": [], "solver": "/".join(solvers), "status": "Not Solved"}
+    return with_fallback(best, n, fallback)
+
+def compare_symmetry(ns, configs=None, backend: str = "matrix", solver_name: str = "highs", formulations=("base",)):
+    # Time and branch-and-bound nodes (matrix backend only) for each set of symmetry breaking layers
+    # and each formulation, e.g. compare_symmetry(range(14, 22, 2), [DEFAULT_SB], formulations=("base", "tight"))
+    configs = configs or [(), ("team1",), ("orbital",), DEFAULT_SB, ("week1",), ("week1", "home"), ("week1", "home", "orbital")]
+    rows = []
+    for n in ns:
+        for formulation in formulations:
+            for sb in configs:
+                start = time.time()
+                res = solve_tournament(n, solver_name=solver_name, backend=backend, fallback=False, sb=sb, formulation=formulation)
+                elapsed = time.time() - start
+                rows.append((n, formulation, sb, elapsed, res.get("nodes"), res["obj"], res["optimal"]))
+                print(f"n={n} formulation={formulation} sb={'+'.join(sb) or 'none'} time={elapsed:.2f}s nodes={res.get('nodes')} obj={res['obj']} optimal={res['optimal']}")
+    return rows
+
 def save_merge_json(n: int, key: str, payload: dict, base_dir: str = "res/MIP"):
     os.makedirs(base_dir, exist_ok=True)
     path = os.path.join(base_dir, f"{n}.json")
@@ -103,14 +277,21 @@ def save_merge_json(n: int, key: str, payload: dict, base_dir: str = "res/MIP"):
         json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
     return path
 
-def main():
+def main(backend: str = "pulp", initial=None, race: bool = False, threads=None):
     ns = [6, 8, 10, 12, 14]
-    solvers = ["highs", "cbc"]
+    solvers = ["highs"] if backend == "matrix" else ["highs", "cbc"]
     for n in ns:
+        if race and backend == "pulp":
+            print(f"start n={n} race={'/'.join(solvers)}")
+            for name, res in race_tournament(n, solvers, threads, initial=initial, keep_all=True).items():
+                if res is not None:
+                    out_path = save_merge_json(n, f"{name}_dev", res, base_dir="res/MIP")
+                    print(f"saved {out_path} key={name}_dev")
+            continue
         for name in solvers:
-            print(f"start n={n} solver={name}")
-            res = solve_tournament(n, verbose=False, solver_name=name)
-            key = f"{res['solver']}_dev"
+            print(f"start n={n} solver={name} backend={backend}")
+            res = solve_tournament(n, verbose=False, solver_name=name, backend=backend, initial=initial)
+            key = f"{res['solver']}_dev" if backend == "pulp" else f"{res['solver']}_{backend}_dev"
             out_path = save_merge_json(n, key, res, base_dir="res/MIP")
             print(f"saved {out_path} key={key}")
 
@@ -0,0 +1,24 @@
+import sys, time
+from utils.construct import construct_schedule, supported
+from utils.orientation import imbalance
+from utils.bounds import reaches_bound
+from MIP import save_merge_json
+
+def solve_constructive(n: int):
+    start = time.time()
+    sol = construct_schedule(n)
+    obj = imbalance(sol, n)
+    return {"time": int(time.time() - start), "optimal": reaches_bound(obj, n), "obj": obj, "sol": sol, "solver": "constructive", "status": "Optimal"}
+
+def main(argv=None):
+    ns = [int(a) for a in (sys.argv[1:] if argv is None else argv)] or [6, 8, 12, 14]
+    for n in ns:
+        if not supported(n):
+            print(f"skip n={n}: no direct construction for n % 6 == 4")
+            continue
+        res = solve_constructive(n)
+        out_path = save_merge_json(n, "constructive", res, base_dir="res/MIP")
+        print(f"saved {out_path} key=constructive obj={res['obj']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+# Lower bounds on the home/away objectives. Every team plays n - 1 games, an odd
+# number, so it is at least 1/2 away from (n-1)/2 home games and at least 1 away
+# from as many home as away games. utils.orientation reaches both bounds, so an
+# optimizer can stop as soon as an incumbent does.
+
+def team_deviation_bound(n: int):
+    """|home games - (n-1)/2| of any single team."""
+    return 0.5
+
+def mip_lower_bound(n: int):
+    """sum over teams of |home games - (n-1)/2| (MIP.py, SAT fairness)."""
+    return n // 2
+
+def cp_lower_bound(n: int):
+    """sum over teams of |home games - away games| (two-phase CP)."""
+    return n
+
+def reaches_bound(obj, n: int, units: str = "mip"):
+    if obj is None:
+        return False
+    return obj <= (mip_lower_bound(n) if units == "mip" else cp_lower_bound(n))
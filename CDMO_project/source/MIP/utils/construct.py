@@ -0,0 +1,28 @@
+from utils.orientation import orient
+
+# Direct construction of a periods x weeks schedule in O(n^2), no solver.
+# Circle method on Z_{n-1} plus team n (the fixed point): round r pairs n with r
+# and r + k with r - k for k = 1..n/2-1. Putting pair k in period k gives every
+# team exactly two games per period, except that team n plays all n - 1 games
+# in period 0. Round r therefore moves the game of team n to period
+# q(r) = +-2r mod (n-1) and the pair of slot q(r) down to period 0. Rounds r and
+# -r share q(r), so each one takes the opponent of team n in the other out of
+# period q(r); the only other teams sent to period 0 are 3r and -3r, which never
+# collide when 3 does not divide n - 1. That leaves n % 6 == 4 (n = 4, 10,
+# 16, ...), where no swap of this kind works and a solver is still needed.
+
+def supported(n: int):
+    return n % 2 == 0 and n >= 6 and n % 6 != 4
+
+def construct_schedule(n: int):
+    if not supported(n):
+        raise ValueError("direct construction needs an even n >= 6 with n % 6 != 4")
+    m, N = n // 2, n - 1
+    solution = [[None for _ in range(N)] for _ in range(m)]
+    for r in range(N):
+        q = min(2 * r % N, -2 * r % N)
+        for k in range(m):
+            pair = [n, r + 1] if k == 0 else [(r + k) % N + 1, (r - k) % N + 1]
+            p = q if k == 0 else (0 if k == q else k)
+            solution[p][r] = pair
+    return orient(solution, n)
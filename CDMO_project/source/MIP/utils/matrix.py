@@ -0,0 +1,168 @@
+import time, math
+import numpy as np
+import highspy
+from utils.symmetry import round_robin_weeks, DEFAULT_SB
+from utils.orientation import orient, imbalance
+from utils.warmstart import weeks_of
+from utils.bounds import team_deviation_bound, reaches_bound
+
+# Same model as MIP.solve_tournament, written straight into a row-wise sparse
+# matrix and solved through the HiGHS Python API (no LP file, no subprocess).
+# Columns: y[m, p] at m * P + p, then h[m], then (formulation="tight") s[t, p],
+# then d_plus[t], then d_minus[t], with m the index of the match in round_robin_weeks order.
+# home_count, z_min and z_max are substituted out: they do not affect the objective.
+# With fairness="euler" only the y columns are built and utils.orientation orients the result.
+
+STATUS = {
+    highspy.HighsModelStatus.kOptimal: "Optimal",
+    highspy.HighsModelStatus.kInfeasible: "Infeasible",
+    highspy.HighsModelStatus.kUnbounded: "Unbounded",
+    highspy.HighsModelStatus.kUnboundedOrInfeasible: "Infeasible",
+}
+
+def build_matrix(n: int, fairness: str = "mip", week_pairs=None, sb=DEFAULT_SB, formulation: str = "base"):
+    week_pairs = week_pairs or round_robin_weeks(n)
+    matches = [ij for pairs in week_pairs for ij in pairs]
+    M, P = len(matches), n // 2
+    Y, H = 0, M * P
+    S = H + M if fairness == "mip" else H
+    DP = S + n * P if formulation == "tight" else S
+    DM = DP + n
+    num_col = DM + n if fairness == "mip" else DP
+    by_team = [[] for _ in range(n + 1)]
+    for m, (i, j) in enumerate(matches):
+        by_team[i].append(m)
+        by_team[j].append(m)
+    start, index, value, row_lower, row_upper = [0], [], [], [], []
+
+    def add_row(cols, coefs, lo, hi):
+        index.extend(cols)
+        value.extend(coefs)
+        start.append(len(index))
+        row_lower.append(lo)
+        row_upper.append(hi)
+
+    for m in range(M):
+        add_row([Y + m * P + p for p in range(P)], [1.0] * P, 1.0, 1.0)
+    m = 0
+    for pairs in week_pairs:
+        for p in range(P):
+            add_row([Y + (m + k) * P + p for k in range(len(pairs))], [1.0] * len(pairs), 1.0, 1.0)
+        m += len(pairs)
+    if formulation == "tight":
+        # occupancy of t in p is 2 - s[t, p]: every team plays once in exactly one
+        # period, and every period has exactly two teams playing there once
+        for t in range(1, n + 1):
+            for p in range(P):
+                add_row([Y + m * P + p for m in by_team[t]] + [S + (t - 1) * P + p], [1.0] * (len(by_team[t]) + 1), 2.0, 2.0)
+            add_row([S + (t - 1) * P + p for p in range(P)], [1.0] * P, 1.0, 1.0)
+        for p in range(P):
+            add_row([S + (t - 1) * P + p for t in range(1, n + 1)], [1.0] * n, 2.0, 2.0)
+    else:
+        for t in range(1, n + 1):
+            for p in range(P):
+                add_row([Y + m * P + p for m in by_team[t]], [1.0] * len(by_team[t]), -highspy.kHighsInf, 2.0)
+    if fairness == "mip":
+        # home games of t: h over matches where t is listed first, 1 - h where it is second
+        target = (n - 1) / 2.0
+        for t in range(1, n + 1):
+            cols = [H + m for m in by_team[t]] + [DP + t - 1, DM + t - 1]
+            coefs = [1.0 if matches[m][0] == t else -1.0 for m in by_team[t]] + [-1.0, 1.0]
+            rhs = target - sum(1 for m in by_team[t] if matches[m][1] == t)
+            add_row(cols, coefs, rhs, rhs)
+            add_row([DP + t - 1, DM + t - 1], [1.0, 1.0], team_deviation_bound(n), highspy.kHighsInf)
+
+    col_lower = np.zeros(num_col)
+    col_upper = np.ones(num_col)
+    col_upper[DP:] = highspy.kHighsInf
+    col_cost = np.zeros(num_col)
+    col_cost[DP:] = 1.0
+    if "team1" in sb:
+        # team 1 plays its first-week match in period 1
+        m1 = next(m for m, ij in enumerate(matches[:P]) if 1 in ij)
+        col_lower[Y + m1 * P] = 1.0
+    if "week1" in sb:
+        for k in range(P):
+            col_lower[Y + k * P + k] = 1.0
+    if "home" in sb and fairness == "mip":
+        col_lower[H] = 1.0
+
+    lp = highspy.HighsLp()
+    lp.num_col_, lp.num_row_ = num_col, len(row_lower)
+    lp.sense_ = highspy.ObjSense.kMinimize
+    lp.col_cost_, lp.col_lower_, lp.col_upper_ = col_cost, col_lower, col_upper
+    lp.row_lower_, lp.row_upper_ = np.array(row_lower), np.array(row_upper)
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.start_ = np.array(start, dtype=np.int32)
+    lp.a_matrix_.index_ = np.array(index, dtype=np.int32)
+    lp.a_matrix_.value_ = np.array(value)
+    n_int = min(DP, num_col)
+    lp.integrality_ = [highspy.HighsVarType.kInteger] * n_int + [highspy.HighsVarType.kContinuous] * (num_col - n_int)
+    return lp, matches, (Y, H, S, DP, DM)
+
+def start_vector(initial, n: int, lp, matches, cols, fairness: str = "mip"):
+    # MIP start with every column set, so HiGHS takes it as an incumbent directly
+    Y, H, S, DP, DM = cols
+    P = n // 2
+    x = np.zeros(lp.num_col_)
+    index = {ij: m for m, ij in enumerate(matches)}
+    home = [0] * (n + 1)
+    for p, row in enumerate(initial):
+        for a, b in row:
+            m = index[(min(a, b), max(a, b))]
+            x[Y + m * P + p] = 1.0
+            if fairness == "mip":
+                x[H + m] = float(a < b)
+            home[a] += 1
+        if DP > S:
+            for t in range(1, n + 1):
+                x[S + (t - 1) * P + p] = float(sum(t in ab for ab in row) == 1)
+    if fairness == "mip":
+        for t in range(1, n + 1):
+            x[DP + t - 1] = max(0.0, home[t] - (n - 1) / 2.0)
+            x[DM + t - 1] = max(0.0, (n - 1) / 2.0 - home[t])
+    solution = highspy.HighsSolution()
+    solution.col_value = list(x)
+    solution.value_valid = True
+    return solution
+
+def solve_matrix(n: int, verbose: bool = False, time_limit: int = 300, fairness: str = "mip", initial=None, sb=DEFAULT_SB, formulation: str = "base"):
+    # initial: a normalized schedule; its weeks replace round_robin_weeks (see utils.warmstart)
+    week_pairs = weeks_of(initial) if initial else round_robin_weeks(n)
+    P = n // 2
+    start = time.time()
+    lp, matches, cols = build_matrix(n, fairness, week_pairs, sb, formulation)
+    Y, H = cols[:2]
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", verbose)
+    h.setOptionValue("time_limit", float(time_limit))
+    h.setOptionValue("threads", 1)
+    h.setOptionValue("mip_detect_symmetry", "orbital" in sb)
+    h.passModel(lp)
+    if initial:
+        h.setSolution(start_vector(initial, n, lp, matches, cols, fairness))
+    h.run()
+    wall = int(math.floor(time.time() - start))
+    model_status = h.getModelStatus()
+    status = STATUS.get(model_status, "Not Solved")
+    info = h.getInfo()
+    feasible = info.primal_solution_status == 2
+    obj_val = int(round(info.objective_function_value)) if feasible else None
+    solution = []
+    if feasible:
+        x = np.asarray(h.getSolution().col_value)
+        solution = [[None for _ in week_pairs] for _ in range(P)]
+        m = 0
+        for w, pairs in enumerate(week_pairs):
+            for i, j in pairs:
+                p = int(np.argmax(x[Y + m * P:Y + (m + 1) * P]))
+                home, away = (i, j) if fairness != "mip" or x[H + m] > 0.5 else (j, i)
+                solution[p][w] = [home, away]
+                m += 1
+        if fairness == "euler":
+            solution = orient(solution, n)
+            obj_val = imbalance(solution, n)
+    optimal = model_status == highspy.HighsModelStatus.kOptimal or (feasible and reaches_bound(obj_val, n))
+    if not optimal:
+        wall = time_limit
+    return {"time": wall, "optimal": optimal, "obj": obj_val, "sol": solution, "solver": "highs", "status": status, "nodes": info.mip_node_count}
@@ -0,0 +1,35 @@
+def is_match(x):
+    return isinstance(x, (list, tuple)) and len(x) == 2 and all(isinstance(t, int) for t in x)
+
+def matches_of(schedule):
+    # Walk any nesting of [home, away] pairs ([periods][weeks] for MIP/SAT, [weeks][periods] for CP)
+    if is_match(schedule):
+        yield schedule
+    elif isinstance(schedule, (list, tuple)):
+        for item in schedule:
+            yield from matches_of(item)
+
+def home_team(i: int, j: int, n: int):
+    # Circulant orientation of K_{n+1}: i hosts j iff j - i (mod n+1) is in 1..n/2.
+    # In K_{n+1} every team then hosts exactly n/2 games, so after dropping the
+    # dummy team n+1 every team hosts n/2 or n/2 - 1 of its n - 1 games.
+    return i if (j - i) % (n + 1) <= n // 2 else j
+
+def orient(schedule, n: int):
+    """Same schedule (any nesting) with every match re-oriented for optimal home/away balance."""
+    if is_match(schedule):
+        i, j = schedule
+        h = home_team(i, j, n)
+        return [h, j if h == i else i]
+    return [orient(item, n) for item in schedule]
+
+def home_counts(schedule, n: int):
+    home = [0] * (n + 1)
+    for h, a in matches_of(schedule):
+        home[h] += 1
+    return home
+
+def imbalance(schedule, n: int):
+    """sum over teams of |home games - (n-1)/2|, the MIP objective."""
+    home = home_counts(schedule, n)
+    return int(round(sum(abs(home[t] - (n - 1) / 2) for t in range(1, n + 1))))
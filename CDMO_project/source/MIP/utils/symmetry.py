@@ -15,3 +15,22 @@ def round_robin_weeks(n: int):
         weeks.append(pairs)
         A = [A[0]] + [A[-1]] + A[1:-1]
     return weeks
+
+# Optional symmetry-breaking layers for the MIP (both backends):
+#   team1   - team 1 plays its first-week match in period 1
+#   week1   - the k-th first-week match is played in period k. This also
+#             subsumes column-lex ordering of the periods: the first-week block
+#             tells all periods apart, and ordering them by it is exactly this
+#             fixing, so there is no separate lex layer
+#   home    - the first match is played at home by its lower team; flipping
+#             every home/away keeps the imbalance, so half the orientations go
+#   orbital - solver-side orbital fixing (HiGHS mip_detect_symmetry; CBC as
+#             shipped with PuLP has no orbital branching and ignores it)
+SB_LAYERS = ("team1", "week1", "home", "orbital")
+DEFAULT_SB = ("team1", "orbital")
+
+def check_sb(sb):
+    unknown = [name for name in sb if name not in SB_LAYERS]
+    if unknown:
+        raise ValueError(f"unknown symmetry breaking layers {unknown}, choose from {SB_LAYERS}")
+    return tuple(sb)
@@ -0,0 +1,61 @@
+import os, json
+from utils.orientation import imbalance
+from utils.construct import construct_schedule, supported
+
+# Initial schedules for a MIP start. A schedule is periods x weeks of [home, away],
+# the res/* format. solve_tournament takes the weeks from the start schedule, so
+# any valid schedule maps onto its y/h variables.
+
+RES_DIRS = ("res/MIP", "res/SAT", "res/CP")
+
+def valid_schedule(sol, n: int):
+    m, W = n // 2, n - 1
+    if not sol or len(sol) != m or any(len(row) != W for row in sol):
+        return False
+    games = set()
+    for w in range(W):
+        if sorted(t for p in range(m) for t in sol[p][w]) != list(range(1, n + 1)):
+            return False
+    for row in sol:
+        count = {}
+        for h, a in row:
+            count[h] = count.get(h, 0) + 1
+            count[a] = count.get(a, 0) + 1
+            games.add((min(h, a), max(h, a)))
+        if max(count.values()) > 2:
+            return False
+    return len(games) == n * (n - 1) // 2
+
+def weeks_of(sol):
+    return [[tuple(sorted(row[w])) for row in sol] for w in range(len(sol[0]))]
+
+def normalize(sol, sb=()):
+    # Swap two periods so that team 1 plays its first-week game in period 1, as the MIP fixes.
+    # The start's own first week gives the week1 order, so that needs nothing more.
+    p = next(p for p, row in enumerate(sol) if 1 in row[0])
+    sol = [list(row) for row in sol]
+    sol[0], sol[p] = sol[p], sol[0]
+    if "home" in sb and sol[0][0][0] > sol[0][0][1]:
+        sol = [[[a, h] for h, a in row] for row in sol]
+    return sol
+
+def schedules_from_results(n: int, base_dirs=RES_DIRS):
+    for base_dir in base_dirs:
+        path = os.path.join(base_dir, f"{n}.json")
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError:
+                continue
+        for entry in data.values():
+            if isinstance(entry, dict) and valid_schedule(entry.get("sol"), n):
+                yield entry["sol"]
+
+def initial_schedule(n: int, base_dirs=RES_DIRS, construct: bool = True):
+    """Fairest valid schedule among the result files and the direct construction (None if there is none)."""
+    candidates = list(schedules_from_results(n, base_dirs))
+    if construct and supported(n):
+        candidates.append(construct_schedule(n))
+    return min(candidates, key=lambda s: imbalance(s, n), default=None)
@@ -1,14 +1,27 @@
-from z3 import *
 import os
+import re
+import sys
+import time
+import math
 import json
+import hashlib
+import itertools
+import subprocess
+
+# round_robin_weeks and the objective bounds live with the MIP model
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "MIP"))
+from utils.symmetry import round_robin_weeks
+from utils.bounds import reaches_bound
 
 # I will use sequential encoding from the labs because it is more
 # efficient compared to naive pairwise encoding for constraints
 
 def at_least_one_seq(bool_vars):
+  from z3 import Or
   return Or(bool_vars)
 
 def at_most_one_seq(bool_vars, name):
+  from z3 import Bool, And, Or, Not
   constraints = []
   n = len(bool_vars)
   s = [Bool(f"s_{name}_{i}") for i in range(n - 1)]
@@ -23,12 +36,15 @@ def at_most_one_seq(bool_vars, name):
   return And(constraints)
 
 def exactly_one_seq(bool_vars, name):
+  from z3 import And
   return And(at_least_one_seq(bool_vars), at_most_one_seq(bool_vars, name))
 
 def at_least_k_seq(bool_vars, k, name):
+  from z3 import Not
   return at_most_k_seq([Not(var) for var in bool_vars], len(bool_vars)-k, name)
 
 def at_most_k_seq(bool_vars, k, name):
+  from z3 import Bool, And, Or, Not
   constraints = []
   n = len(bool_vars)
   s = [[Bool(f"s_{name}_{i}_{j}") for j in range(k)] for i in range(n - 1)]
@@ -50,8 +66,159 @@ def at_most_k_seq(bool_vars, k, name):
   return And(constraints)
 
 def exactly_k_seq(bool_vars, k, name):
+  from z3 import And
   return And(at_most_k_seq(bool_vars, k, name), at_least_k_seq(bool_vars, k, name))
 
+# Alternative cardinality encodings. Every constraint family of the models
+# ("pair", "team_week", "slot", "team_period") can pick its own backend:
+#   "seq"       sequential counter above
+#   "pairwise"  binomial encoding without auxiliary variables (small groups only)
+#   "totalizer" unary counting tree
+#   "network"   odd-even merge sorting network
+#   "pb"        Z3's native AtMost / AtLeast / PbEq
+
+CARD_BACKENDS = ("seq", "pairwise", "totalizer", "network", "pb")
+CARD_FAMILIES = ("pair", "team_week", "slot", "team_period")
+DEFAULT_CARD = {family: "seq" for family in CARD_FAMILIES}
+# Bounds on home games added by the fairness optimization
+DEFAULT_CARD["fairness"] = "seq"
+
+# Pairwise encodings bigger than this many clauses fall back to "seq"
+PAIRWISE_LIMIT = 5000
+
+def pairwise_at_most_k(bool_vars, k):
+  from z3 import And, Or, Not
+  return And([Or([Not(v) for v in subset]) for subset in itertools.combinations(bool_vars, k + 1)])
+
+def pairwise_at_least_k(bool_vars, k):
+  from z3 import And, Or
+  return And([Or(list(subset)) for subset in itertools.combinations(bool_vars, len(bool_vars) - k + 1)])
+
+def totalizer(bool_vars, cap, name):
+  """
+  Build a totalizer over bool_vars.
+  Returns (r, constraints) where r[i] is true iff at least i+1 inputs are true,
+  counting only up to cap.
+  """
+  from z3 import Bool, Or, Not
+  constraints = []
+  nodes = []
+
+  def build(vs):
+    if len(vs) == 1:
+      return list(vs)
+    left = build(vs[:len(vs) // 2])
+    right = build(vs[len(vs) // 2:])
+    size = min(len(left) + len(right), cap)
+    r = [Bool(f"tot_{name}_{len(nodes)}_{i}") for i in range(size)]
+    nodes.append(r)
+    for i in range(len(left) + 1):
+      for j in range(len(right) + 1):
+        # i true on the left and j on the right -> at least i+j
+        if i + j > 0:
+          lhs = ([Not(left[i-1])] if i else []) + ([Not(right[j-1])] if j else [])
+          constraints.append(Or(lhs + [r[min(i + j, size) - 1]]))
+        # fewer than i+1 on the left and j+1 on the right -> fewer than i+j+1
+        if i + j < size:
+          lhs = ([left[i]] if i < len(left) else []) + ([right[j]] if j < len(right) else [])
+          constraints.append(Or(lhs + [Not(r[i + j])]))
+    return r
+
+  return build(list(bool_vars)), constraints
+
+def sorting_network(bool_vars, name):
+  """
+  Batcher's odd-even merge sort over bool_vars.
+  Returns (out, constraints) where out is sorted with true values first.
+  """
+  from z3 import Bool, BoolVal, Or, Not, is_false
+  size = 1
+  while size < len(bool_vars):
+    size *= 2
+  wires = list(bool_vars) + [BoolVal(False)] * (size - len(bool_vars))
+  constraints = []
+  count = 0
+  p = 1
+  while p < size:
+    k = p
+    while k >= 1:
+      for j in range(k % p, size - k, 2 * k):
+        for i in range(min(k - 1, size - j - k - 1) + 1):
+          if (i + j) // (2 * p) != (i + j + k) // (2 * p):
+            continue
+          a, b = wires[i + j], wires[i + j + k]
+          if is_false(b):
+            continue
+          if is_false(a):
+            wires[i + j], wires[i + j + k] = b, a
+            continue
+          hi = Bool(f"net_{name}_{count}_hi")
+          lo = Bool(f"net_{name}_{count}_lo")
+          count += 1
+          constraints += [Or(Not(a), hi), Or(Not(b), hi), Or(Not(hi), a, b),
+                          Or(Not(a), Not(b), lo), Or(Not(lo), a), Or(Not(lo), b)]
+          wires[i + j], wires[i + j + k] = hi, lo
+      k //= 2
+    p *= 2
+  return wires[:len(bool_vars)], constraints
+
+def at_most_k(bool_vars, k, name, backend="seq"):
+  from z3 import BoolVal, And, Not, AtMost
+  if k >= len(bool_vars):
+    return BoolVal(True)
+  if k == 0:
+    return And([Not(v) for v in bool_vars])
+  if backend == "pairwise" and math.comb(len(bool_vars), k + 1) <= PAIRWISE_LIMIT:
+    return pairwise_at_most_k(bool_vars, k)
+  if backend == "totalizer":
+    r, constraints = totalizer(bool_vars, k + 1, name)
+    return And(constraints + [Not(r[k])])
+  if backend == "network":
+    out, constraints = sorting_network(bool_vars, name)
+    return And(constraints + [Not(out[k])])
+  if backend == "pb":
+    return AtMost(*bool_vars, k)
+  if k == 1:
+    return at_most_one_seq(bool_vars, name)
+  return at_most_k_seq(bool_vars, k, name)
+
+def at_least_k(bool_vars, k, name, backend="seq"):
+  from z3 import BoolVal, And, AtLeast
+  if k <= 0:
+    return BoolVal(True)
+  if k >= len(bool_vars):
+    return And(bool_vars) if k == len(bool_vars) else BoolVal(False)
+  if backend == "pairwise" and math.comb(len(bool_vars), len(bool_vars) - k + 1) <= PAIRWISE_LIMIT:
+    return pairwise_at_least_k(bool_vars, k)
+  if backend == "totalizer":
+    r, constraints = totalizer(bool_vars, k, name)
+    return And(constraints + [r[k-1]])
+  if backend == "network":
+    out, constraints = sorting_network(bool_vars, name)
+    return And(constraints + [out[k-1]])
+  if backend == "pb":
+    return AtLeast(*bool_vars, k)
+  if k == 1:
+    return at_least_one_seq(bool_vars)
+  return at_least_k_seq(bool_vars, k, f"{name}_ge")
+
+def exactly_k(bool_vars, k, name, backend="seq"):
+  from z3 import And, Not, PbEq
+  if backend == "totalizer":
+    r, constraints = totalizer(bool_vars, k + 1, name)
+    return And(constraints + [r[k-1]] + ([Not(r[k])] if k < len(r) else []))
+  if backend == "network":
+    out, constraints = sorting_network(bool_vars, name)
+    return And(constraints + [out[k-1]] + ([Not(out[k])] if k < len(out) else []))
+  if backend == "pb":
+    return PbEq([(v, 1) for v in bool_vars], k)
+  return And(at_most_k(bool_vars, k, name, backend), at_least_k(bool_vars, k, name, backend))
+
+def exactly_one(bool_vars, name, backend="seq"):
+  if backend == "seq":
+    return exactly_one_seq(bool_vars, name)
+  return exactly_k(bool_vars, 1, name, backend)
+
 ########################################
 
 def validate_solution(solution, n):
@@ -118,136 +285,534 @@ def validate_solution(solution, n):
             return False
 
     # 4. Check no team plays more than twice in any period across tournament
+    for t, p, appearances in period_violations(solution, n):
+        print(f"Team {t} appears {appearances} times in period {p+1}")
+        return False
+
+    return True
+
+def period_violations(solution, n):
+    """
+    List the (team, period, appearances) triples where a team plays more than
+    twice in the same period. Teams are 1-based, periods 0-based.
+    """
+    violations = []
     for t in range(1, n+1):
-        for p in range(periods):
+        for p in range(len(solution)):
             appearances = 0
-            for w in range(weeks):
-                game = solution[p][w]
+            for game in solution[p]:
                 if t in game:
                     appearances += 1
             if appearances > 2:
-                print(f"Team {t} appears {appearances} times in period {p+1}")
-                return False
-
-    return True
+                violations.append((t, p, appearances))
+    return violations
 
 ####################################
+# Encodings
+#
+# "tensor": x[w][p][t1][t2] is true when t1 hosts t2 in week w, period p.
+#           This is the original model, n^4/2 variables.
+# "match":  m[w][p][k] picks one unordered match k for every (week, period)
+#           slot and o[k] says whether the lower-indexed team of k plays at
+#           home. Two channelling layers (match k is played in week w, team t
+#           plays in slot (w,p)) keep every cardinality constraint over at most
+#           n(n-1)/2 literals instead of ~2(n-1)^2.
 
-def Sat_solution(n,sb):
-  # n: Number of teams (must be even)
+def match_list(n):
+  # All unordered matches (t1, t2) with t1 < t2, 0-based
+  return [(t1, t2) for t1 in range(n) for t2 in range(t1 + 1, n)]
 
-  # Initialize Z3 solver
-  solver = Solver()
-  # Set timeout
-  solver.set("timeout", 300 * 1000)
+# Symmetry breaking variants used when sb=True. Every encoding returns its
+# variants by name from symmetry_breaking_variants(); extra ones (such as
+# "team0_weeks") are opt-in by listing them explicitly.
+DEFAULT_SB = ("fix_week1", "home_lower")
+
+class Encoding:
+  # When set before constraints(), the team/period family is left out and
+  # added on demand through team_period_constraints(t, p)
+  lazy_periods = False
+
+  def first_week_pairs(self):
+    # Matches the "fix_week1" symmetry breaking puts in the first week
+    return [(2 * p, 2 * p + 1) for p in range(self.periods)]
+
+  def sb_names(self, sb):
+    # sb may be True/False or an explicit list of variant names
+    if sb is True:
+      return list(DEFAULT_SB)
+    if not sb:
+      return []
+    return list(sb)
+
+class TensorEncoding(Encoding):
+  name = "tensor"
 
-  # Set number of weeks and periods
-  weeks = n - 1
-  periods = n // 2
+  def __init__(self, n, card=None):
+    from z3 import Bool
+    self.n = n
+    # Cardinality backend per constraint family
+    self.card = dict(DEFAULT_CARD, **(card or {}))
+    self.weeks = n - 1
+    self.periods = n // 2
+    # x[w][p][t1][t2] week, period, team 1 vs team 2"
+    self.x = [[[[Bool(f"x_{w}_{p}_{t1}_{t2}") for t2 in range(n)] for t1 in range(n)] for p in range(self.periods)] for w in range(self.weeks)]
 
-  # x[w][p][t1][t2] week, period, team 1 vs team 2"
-  x = [[[[Bool(f"x_{w}_{p}_{t1}_{t2}") for t2 in range(n)] for t1 in range(n)] for p in range(periods)] for w in range(weeks)]
+  def constraints(self):
+    from z3 import Not
+    n, weeks, periods, x = self.n, self.weeks, self.periods, self.x
+    constraints = []
 
-  # Every pair of teams plays exactly once
-  for t1 in range(n):
-    for t2 in range(t1 + 1, n):
-      games = []
+    # Every pair of teams plays exactly once
+    for t1 in range(n):
+      for t2 in range(t1 + 1, n):
+        games = []
+        for w in range(weeks):
+          for p in range(periods):
+            games.append(x[w][p][t1][t2])  # t1 vs t2
+            games.append(x[w][p][t2][t1])  # t2 vs t1
+        # add exactly one
+        constraints.append(exactly_one(games, f"pair_{t1}_{t2}", self.card["pair"]))
+
+    # Every team plays exactly once per week
+    for t1 in range(n):
       for w in range(weeks):
+        games_in_week = []
         for p in range(periods):
-          games.append(x[w][p][t1][t2])  # t1 vs t2
-          games.append(x[w][p][t2][t1])  # t2 vs t1
-      # add exactly one
-      solver.add(exactly_one_seq(games, f"pair_{t1}_{t2}"))
+          for t2 in range(n):
+            if t2 != t1:
+              games_in_week.append(x[w][p][t1][t2])  # t1 vs t2
+              games_in_week.append(x[w][p][t2][t1])  # t2 vs t1
+        # add exactly one
+        constraints.append(exactly_one(games_in_week, f"team_{t1}_week_{w}", self.card["team_week"]))
 
-  # Every team plays exactly once per week
-  for t1 in range(n):
+    # Each period in each week has exactly one game
     for w in range(weeks):
-      games_in_week = []
       for p in range(periods):
-        for t2 in range(n):
-          if t2 != t1:
-            games_in_week.append(x[w][p][t1][t2])  # t1 vs t2
-            games_in_week.append(x[w][p][t2][t1])  # t2 vs t1
-      # add exactly one
-      solver.add(exactly_one_seq(games_in_week, f"team_{t1}_week_{w}"))
-
-  # Each period in each week has exactly one game
-  for w in range(weeks):
-    for p in range(periods):
-      games_in_slot = []
+        games_in_slot = []
+        for t1 in range(n):
+          for t2 in range(n):
+            if t1 != t2:
+              games_in_slot.append(x[w][p][t1][t2])
+        # add exactly one
+        constraints.append(exactly_one(games_in_slot, f"week_{w}_period_{p}", self.card["slot"]))
+
+    # Every team plays at most twice in the same period across all weeks
+    if not self.lazy_periods:
       for t1 in range(n):
-        for t2 in range(n):
-          if t1 != t2:
-            games_in_slot.append(x[w][p][t1][t2])
-      # add exactly one
-      solver.add(exactly_one_seq(games_in_slot, f"week_{w}_period_{p}"))
-
-  # Every team plays at most twice in the same period across all weeks
-  for t1 in range(n):
-    for p in range(periods):
-      games_in_period = []
+        for p in range(periods):
+          constraints += self.team_period_constraints(t1, p)
+
+    # No team plays against itself
+    for w in range(weeks):
+      for p in range(periods):
+        for t in range(n):
+          constraints.append(Not(x[w][p][t][t]))
+
+    return constraints
+
+  def team_period_constraints(self, t1, p):
+    x = self.x
+    games_in_period = []
+    for w in range(self.weeks):
+      for t2 in range(self.n):
+        if t2 != t1:
+          games_in_period.append(x[w][p][t1][t2])  # t1 vs t2
+          games_in_period.append(x[w][p][t2][t1])  # t2 vs t1
+    # At most two appearances per period across weeks
+    return [at_most_k(games_in_period, 2, f"team_{t1}_period_{p}", self.card["team_period"])]
+
+  def symmetry_breaking_variants(self):
+    from z3 import Not, Or
+    n, weeks, periods, x = self.n, self.weeks, self.periods, self.x
+    variants = {}
+    # 1. Fix first week assignments
+    variants["fix_week1"] = [x[0][p][2 * p][2 * p + 1] for p in range(periods)]
+
+    # 2. In all periods of all weeks, enforce home team has smaller index than away team
+    variants["home_lower"] = [Not(x[w][p][t1][t2]) for w in range(weeks) for p in range(periods)
+                              for t1 in range(n) for t2 in range(n) if t1 >= t2]
+
+    # 3. Weeks after the first are interchangeable: team 0 meets team w+1 in week w
+    variants["team0_weeks"] = [Or([x[w][p][0][w + 1] for p in range(periods)] + [x[w][p][w + 1][0] for p in range(periods)])
+                               for w in range(1, weeks)]
+    return variants
+
+  def slot_options(self, w, p):
+    """(teams, literal) for every unordered match that may occupy slot (w, p)."""
+    from z3 import Or
+    x = self.x
+    return [((t1, t2), Or(x[w][p][t1][t2], x[w][p][t2][t1])) for t1, t2 in match_list(self.n)]
+
+  def blocking_clause(self, schedule, orientation=True):
+    """Clause excluding this schedule (only its pairings if not orientation)."""
+    from z3 import Or, Not
+    x = self.x
+    literals = []
+    for p, period in enumerate(schedule):
+      for w, (home, away) in enumerate(period):
+        t1, t2 = home - 1, away - 1
+        if orientation:
+          literals.append(Not(x[w][p][t1][t2]))
+        else:
+          literals.append(Not(Or(x[w][p][t1][t2], x[w][p][t2][t1])))
+    return Or(literals)
+
+  def home_literals(self, t):
+    """Literals whose count is the number of home games of team t."""
+    from z3 import Or
+    return [Or([self.x[w][p][t][t2] for w in range(self.weeks) for p in range(self.periods)])
+            for t2 in range(self.n) if t2 != t]
+
+  @staticmethod
+  def decode_names(n, true_names):
+    """Build the schedule from the names of the variables that are true."""
+    schedule = [[None] * (n - 1) for p in range(n // 2)]
+    for name in true_names:
+      if name.startswith("x_"):
+        w, p, t1, t2 = map(int, name[2:].split("_"))
+        schedule[p][w] = [t1 + 1, t2 + 1]
+    return schedule
+
+class MatchEncoding(Encoding):
+  name = "match"
+
+  def __init__(self, n, card=None):
+    from z3 import Bool
+    self.n = n
+    # Cardinality backend per constraint family
+    self.card = dict(DEFAULT_CARD, **(card or {}))
+    self.weeks = n - 1
+    self.periods = n // 2
+    self.matches = match_list(n)
+    K = len(self.matches)
+    # m[w][p][k]: match k is played in week w, period p
+    self.m = [[[Bool(f"m_{w}_{p}_{k}") for k in range(K)] for p in range(self.periods)] for w in range(self.weeks)]
+    # o[k]: the lower-indexed team of match k plays at home
+    self.o = [Bool(f"o_{k}") for k in range(K)]
+    # mw[w][k]: match k is played in week w
+    self.mw = [[Bool(f"mw_{w}_{k}") for k in range(K)] for w in range(self.weeks)]
+    # tp[w][p][t]: team t plays in week w, period p
+    self.tp = [[[Bool(f"tp_{w}_{p}_{t}") for t in range(n)] for p in range(self.periods)] for w in range(self.weeks)]
+
+  def constraints(self):
+    from z3 import Or, Not
+    n, weeks, periods = self.n, self.weeks, self.periods
+    m, mw, tp = self.m, self.mw, self.tp
+    K = len(self.matches)
+    involving = [[k for k, (t1, t2) in enumerate(self.matches) if t in (t1, t2)] for t in range(n)]
+    constraints = []
+
+    # Each period in each week has exactly one match
+    for w in range(weeks):
+      for p in range(periods):
+        constraints.append(exactly_one(m[w][p], f"slot_{w}_{p}", self.card["slot"]))
+
+    # Channel slot choice to "match k in week w" and "team t in slot (w,p)"
+    for w in range(weeks):
+      for k in range(K):
+        for p in range(periods):
+          constraints.append(Or(Not(m[w][p][k]), mw[w][k]))
+        constraints.append(Or([Not(mw[w][k])] + [m[w][p][k] for p in range(periods)]))
+      for p in range(periods):
+        for t in range(n):
+          for k in involving[t]:
+            constraints.append(Or(Not(m[w][p][k]), tp[w][p][t]))
+          constraints.append(Or([Not(tp[w][p][t])] + [m[w][p][k] for k in involving[t]]))
+
+    # Every pair of teams plays exactly once
+    for k in range(K):
+      constraints.append(exactly_one([mw[w][k] for w in range(weeks)], f"pair_{k}", self.card["pair"]))
+
+    # Every team plays exactly once per week
+    for t in range(n):
       for w in range(weeks):
-        for t2 in range(n):
-          if t2 != t1:
-            games_in_period.append(x[w][p][t1][t2])  # t1 vs t2
-            games_in_period.append(x[w][p][t2][t1])  # t2 vs t1
-      # At most two appearances per period across weeks
-      solver.add(at_most_k_seq(games_in_period, 2, f"team_{t1}_period_{p}"))
-
-  # No team plays against itself
-  for w in range(weeks):
-    for p in range(periods):
+        constraints.append(exactly_one([tp[w][p][t] for p in range(periods)], f"team_{t}_week_{w}", self.card["team_week"]))
+
+    # Every team plays at most twice in the same period across all weeks
+    if not self.lazy_periods:
       for t in range(n):
-        solver.add(Not(x[w][p][t][t]))
+        for p in range(periods):
+          constraints += self.team_period_constraints(t, p)
 
-  import time
-  start_time = time.time()
-  # Reduce search space by Symmetry Breaking
-  if sb == True:
+    return constraints
+
+  def team_period_constraints(self, t, p):
+    return [at_most_k([self.tp[w][p][t] for w in range(self.weeks)], 2, f"team_{t}_period_{p}", self.card["team_period"])]
+
+  def symmetry_breaking_variants(self):
+    variants = {}
     # 1. Fix first week assignments
-    for p in range(n // 2):
-      t1 = 2 * p
-      t2 = 2 * p + 1
-      solver.add(x[0][p][t1][t2])
+    variants["fix_week1"] = [self.m[0][p][self.matches.index((2 * p, 2 * p + 1))] for p in range(self.periods)]
+
+    # 2. Home team has smaller index than away team
+    variants["home_lower"] = list(self.o)
+
+    # 3. Weeks after the first are interchangeable: team 0 meets team w+1 in week w
+    variants["team0_weeks"] = [self.mw[w][self.matches.index((0, w + 1))] for w in range(1, self.weeks)]
+    return variants
+
+  def slot_options(self, w, p):
+    """(teams, literal) for every unordered match that may occupy slot (w, p)."""
+    return [(pair, self.m[w][p][k]) for k, pair in enumerate(self.matches)]
+
+  def blocking_clause(self, schedule, orientation=True):
+    """Clause excluding this schedule (only its pairings if not orientation)."""
+    from z3 import Or, Not
+    literals = []
+    for p, period in enumerate(schedule):
+      for w, (home, away) in enumerate(period):
+        k = self.matches.index((min(home, away) - 1, max(home, away) - 1))
+        literals.append(Not(self.m[w][p][k]))
+        if orientation:
+          literals.append(Not(self.o[k]) if home < away else self.o[k])
+    return Or(literals)
+
+  def home_literals(self, t):
+    """Literals whose count is the number of home games of team t."""
+    from z3 import Not
+    return [self.o[k] if t == t1 else Not(self.o[k]) for k, (t1, t2) in enumerate(self.matches) if t in (t1, t2)]
+
+  @staticmethod
+  def decode_names(n, true_names):
+    """Build the schedule from the names of the variables that are true."""
+    matches = match_list(n)
+    schedule = [[None] * (n - 1) for p in range(n // 2)]
+    for name in true_names:
+      if name.startswith("m_"):
+        w, p, k = map(int, name[2:].split("_"))
+        t1, t2 = matches[k]
+        if f"o_{k}" in true_names:
+          schedule[p][w] = [t1 + 1, t2 + 1]
+        else:
+          schedule[p][w] = [t2 + 1, t1 + 1]
+    return schedule
+
+class FixedWeekEncoding(Encoding):
+  """
+  Takes the circle-method weeks of utils/symmetry.round_robin_weeks (shared
+  with the MIP model) as given and only decides the period of every match.
+  y[w][i][p]: match i of week w is played in period p
+  o[w][i]:    the lower-indexed team of that match plays at home; nothing but
+              symmetry breaking constrains these, so orientation is left free
+              for whoever uses the model (e.g. fairness optimization)
+  one[t][p]:  team t plays only once in period p. A team has n-1 games over
+              n/2 periods, at most two each, so it plays exactly once in one
+              period and twice in all others; every period then holds exactly
+              two such teams. These are the tight equalities of the MIP
+              (formulation="tight"): games(t, p) + one[t][p] == 2,
+              sum_p one[t][p] == 1 and sum_t one[t][p] == 2.
+  """
+  name = "fixed_week"
+
+  def __init__(self, n, card=None):
+    from z3 import Bool
+    self.n = n
+    # Cardinality backend per constraint family
+    self.card = dict(DEFAULT_CARD, **(card or {}))
+    self.weeks = n - 1
+    self.periods = n // 2
+    # 0-based pairs, week_pairs[w][i] = (t1, t2) with t1 < t2
+    self.week_pairs = [[(i - 1, j - 1) for (i, j) in pairs] for pairs in round_robin_weeks(n)]
+    self.y = [[[Bool(f"y_{w}_{i}_{p}") for p in range(self.periods)] for i in range(self.periods)] for w in range(self.weeks)]
+    self.o = [[Bool(f"o_{w}_{i}") for i in range(self.periods)] for w in range(self.weeks)]
+    self.one = [[Bool(f"one_{t}_{p}") for p in range(self.periods)] for t in range(n)]
+
+  def constraints(self):
+    n, weeks, periods, y = self.n, self.weeks, self.periods, self.y
+    constraints = []
 
-    # 2. In all periods of all weeks, enforce home team has smaller index than away team
     for w in range(weeks):
+      # Every match of the week gets exactly one period
+      for i in range(periods):
+        constraints.append(exactly_one(y[w][i], f"match_{w}_{i}", self.card["team_week"]))
+      # Each period in each week has exactly one match
       for p in range(periods):
-        for t1 in range(n):
-          for t2 in range(n):
-            if t1 >= t2:
-              solver.add(Not(x[w][p][t1][t2]))
+        constraints.append(exactly_one([y[w][i][p] for i in range(periods)], f"week_{w}_period_{p}", self.card["slot"]))
+
+    # Every team plays at most twice in the same period across all weeks
+    if not self.lazy_periods:
+      for t in range(n):
+        for p in range(periods):
+          constraints += self.team_period_constraints(t, p)
+
+    # One single-game period per team, two single-game teams per period
+    for t in range(n):
+      constraints.append(exactly_one(self.one[t], f"one_team_{t}", self.card["team_period"]))
+    for p in range(periods):
+      constraints.append(exactly_k([self.one[t][p] for t in range(n)], 2, f"one_period_{p}", self.card["team_period"]))
+
+    return constraints
+
+  def team_period_constraints(self, t, p):
+    y = self.y
+    match_of = [next(i for i, pair in enumerate(self.week_pairs[w]) if t in pair) for w in range(self.weeks)]
+    games_in_period = [y[w][match_of[w]][p] for w in range(self.weeks)]
+    # games + one[t][p] == 2: at most twice, and (implied) at least once
+    return [exactly_k(games_in_period + [self.one[t][p]], 2, f"team_{t}_period_{p}", self.card["team_period"])]
+
+  def symmetry_breaking_variants(self):
+    variants = {}
+    # 1. Periods are interchangeable: match i of the first week goes to period i
+    variants["fix_week1"] = [self.y[0][i][i] for i in range(self.periods)]
+
+    # 2. Home team has smaller index than away team
+    variants["home_lower"] = [o for row in self.o for o in row]
+    return variants
+
+  def first_week_pairs(self):
+    return self.week_pairs[0]
+
+  def slot_options(self, w, p):
+    """(teams, literal) for every match of week w that may occupy period p."""
+    return [(pair, self.y[w][i][p]) for i, pair in enumerate(self.week_pairs[w])]
+
+  def blocking_clause(self, schedule, orientation=True):
+    """Clause excluding this schedule (only its pairings if not orientation)."""
+    from z3 import Or, Not
+    literals = []
+    for p, period in enumerate(schedule):
+      for w, (home, away) in enumerate(period):
+        i = self.week_pairs[w].index((min(home, away) - 1, max(home, away) - 1))
+        literals.append(Not(self.y[w][i][p]))
+        if orientation:
+          literals.append(Not(self.o[w][i]) if home < away else self.o[w][i])
+    return Or(literals)
+
+  def home_literals(self, t):
+    """Literals whose count is the number of home games of team t."""
+    from z3 import Not
+    literals = []
+    for w in range(self.weeks):
+      for i, (t1, t2) in enumerate(self.week_pairs[w]):
+        if t == t1:
+          literals.append(self.o[w][i])
+        elif t == t2:
+          literals.append(Not(self.o[w][i]))
+    return literals
+
+  @staticmethod
+  def decode_names(n, true_names):
+    """Build the schedule from the names of the variables that are true."""
+    week_pairs = round_robin_weeks(n)
+    schedule = [[None] * (n - 1) for p in range(n // 2)]
+    for name in true_names:
+      if name.startswith("y_"):
+        w, i, p = map(int, name[2:].split("_"))
+        t1, t2 = week_pairs[w][i]
+        if f"o_{w}_{i}" in true_names:
+          schedule[p][w] = [t1, t2]
+        else:
+          schedule[p][w] = [t2, t1]
+    return schedule
+
+ENCODINGS = {"tensor": TensorEncoding, "match": MatchEncoding, "fixed_week": FixedWeekEncoding}
+
+def build_solver(n, sb, encoding="tensor", card=None, timeout=300, sb_orientation=True, lazy_periods=False):
+  """
+  Create a solver holding the chosen encoding (plus symmetry breaking if sb).
+  card maps constraint families to cardinality backends, e.g. {"slot": "pb"}.
+  sb_orientation=False leaves home/away free, as fairness optimization needs.
+  lazy_periods=True leaves out the at-most-twice-per-period constraints.
+  """
+  from z3 import Solver
+  enc = ENCODINGS[encoding](n, card)
+  enc.lazy_periods = lazy_periods
+  solver = Solver()
+  # Set timeout
+  solver.set("timeout", timeout * 1000)
+  solver.add(enc.constraints())
+  if sb:
+    variants = enc.symmetry_breaking_variants()
+    for name in enc.sb_names(sb):
+      if sb_orientation or name != "home_lower":
+        solver.add(variants[name])
+  return solver, enc
+
+def build_guarded_solver(n, encoding="tensor", card=None, timeout=300):
+  """
+  Build the model once with every symmetry breaking variant guarded by an
+  indicator literal sb_<name>. check_schedule(..., sb_assumptions(enc, guards, sb))
+  then answers any symmetry breaking configuration on the same solver.
+  """
+  from z3 import Bool, Or, Not
+  solver, enc = build_solver(n, False, encoding, card, timeout)
+  guards = {}
+  for name, constraints in enc.symmetry_breaking_variants().items():
+    guards[name] = Bool(f"sb_{name}")
+    for c in constraints:
+      solver.add(Or(Not(guards[name]), c))
+  return solver, enc, guards
+
+def sb_assumptions(enc, guards, sb):
+  return [guards[name] for name in enc.sb_names(sb)]
+
+def model_size(solver):
+  """
+  Count the Boolean variables and clauses asserted in a solver.
+  Top-level conjunctions are flattened, every other assertion counts as one clause.
+  """
+  from z3 import is_const, Z3_OP_UNINTERPRETED
+  clauses = 0
+  variables = set()
+  seen = set()
+  stack = list(solver.assertions())
+  while stack:
+    e = stack.pop()
+    if e.get_id() in seen:
+      continue
+    seen.add(e.get_id())
+    if is_const(e) and e.decl().kind() == Z3_OP_UNINTERPRETED:
+      variables.add(e.decl().name())
+    stack.extend(e.children())
+  for a in solver.assertions():
+    clauses += count_clauses(a)
+  return len(variables), clauses
+
+def count_clauses(e):
+  from z3 import is_and
+  if is_and(e):
+    return sum(count_clauses(c) for c in e.children())
+  return 1
+
+def true_names(model):
+  """
+  Names of the Boolean variables that are true in a Z3 model.
+  The model is printed once and parsed here, which is much cheaper than one
+  model.eval round-trip per variable.
+  """
+  return set(re.findall(r"\(define-fun \|?([^\s|]+)\|? \(\) Bool\s+true\)", model.sexpr()))
 
+####################################
+
+def Sat_solution(n, sb, encoding="tensor", card=None, timeout=300):
+  # n: Number of teams (must be even)
+  solver, enc = build_solver(n, sb, encoding, card, timeout)
+  return check_schedule(solver, enc, n, timeout)
+
+def Sat_solution_configs(n, configs, encoding="tensor", card=None, timeout=300):
+  """
+  Solve n under several symmetry breaking configurations (True, False or lists
+  of variant names) with a single encoded solver. Returns one result per config.
+  """
+  solver, enc, guards = build_guarded_solver(n, encoding, card, timeout)
+  results = []
+  for sb in configs:
+    results.append(check_schedule(solver, enc, n, timeout, sb_assumptions(enc, guards, sb)))
+  return results
+
+def check_schedule(solver, enc, n, timeout=300, assumptions=()):
+  from z3 import sat, unsat
+  solver.set("timeout", timeout * 1000)
+  start_time = time.time()
   # Solve
-  result = solver.check()
+  result = solver.check(*assumptions)
   end_time = time.time()
 
   time_spent = float(end_time - start_time)
 
   # Handle results
   if result == sat:
-    model = solver.model()
-    weeks = n - 1
-    periods = n // 2
-
-    # Initialize empty schedule structure
-    schedule = []
-    for p in range(periods):
-      period_schedule = []
-      for w in range(weeks):
-        # Find which game is assigned to this period and week
-        game_found = False
-        for t1 in range(n):
-          for t2 in range(n):
-            var_val = model.eval(x[w][p][t1][t2])
-            if is_true(var_val):
-              # Convert from 0-based to 1-based team numbering
-              period_schedule.append([t1 + 1, t2 + 1])
-              game_found = True
-              break
-          if game_found:
-              break
-      schedule.append(period_schedule)
+    schedule = enc.decode_names(n, true_names(solver.model()))
     print(f"Solution found in {time_spent:.3f} seconds")
     return {
       "time": time_spent,
@@ -266,27 +831,641 @@ def Sat_solution(n,sb):
       "sol": None}
 
   else:
-    print(f"No solution found within time limit (300 seconds)")
+    print(f"No solution found within time limit ({timeout} seconds)")
     return {
-      "time": 300,
+      "time": timeout,
       "optimal": False,
       "obj": None,
       "sol": None}
 
+def Sat_solution_lazy(n, sb, encoding="tensor", card=None, timeout=300):
+  """
+  Solve without the at-most-twice-per-period family, then add only the
+  team/period constraints the candidate schedule violates and solve again on
+  the same solver, until the schedule is valid. The relaxation being UNSAT
+  proves the full model UNSAT.
+  """
+  from z3 import sat, unsat
+  solver, enc = build_solver(n, sb, encoding, card, timeout, lazy_periods=True)
+  added = set()
+  rounds = 0
+  start_time = time.time()
+  while True:
+    remaining = timeout - (time.time() - start_time)
+    if remaining <= 0:
+      result = None
+      break
+    solver.set("timeout", int(remaining * 1000))
+    result = solver.check()
+    rounds += 1
+    if result != sat:
+      break
+    schedule = enc.decode_names(n, true_names(solver.model()))
+    violations = period_violations(schedule, n)
+    if not violations:
+      break
+    for t, p, appearances in violations:
+      if (t, p) not in added:
+        added.add((t, p))
+        solver.add(enc.team_period_constraints(t - 1, p))
+
+  time_spent = float(time.time() - start_time)
+  print(f"{rounds} rounds, {len(added)} of {n * (n // 2)} team/period constraints added")
+
+  if result == sat:
+    print(f"Solution found in {time_spent:.3f} seconds")
+    return {
+      "time": time_spent,
+      "optimal": True,
+      "obj": None,
+      "sol": schedule,
+      "rounds": rounds,
+      "lazy_added": len(added)}
+
+  elif result == unsat:
+    print(f"After checking for {time_spent:.3f} seconds")
+    print("No solution exists")
+    print(f"{'-'*50}")
+    return {
+      "time": time_spent,
+      "optimal": True,
+      "obj": None,
+      "sol": None}
+
+  else:
+    print(f"No solution found within time limit ({timeout} seconds)")
+    return {
+      "time": timeout,
+      "optimal": False,
+      "obj": None,
+      "sol": None}
+
+####################################
+# DIMACS export and external SAT solvers
+#
+# The model is bit-blasted once per (n, sb, encoding, cardinality backends)
+# and cached as a DIMACS file. The "c <id> <name>" comment lines written by
+# Z3 map the DIMACS variables back to our x_* / m_* / o_* names, so a cached
+# file can be solved and decoded without rebuilding the model.
+
+CNF_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "cache", "SAT")
+
+def cnf_path(n, sb, encoding="tensor", card=None):
+  card = dict(DEFAULT_CARD, **(card or {}))
+  key = ",".join(f"{family}={card[family]}" for family in CARD_FAMILIES)
+  digest = hashlib.sha1(key.encode()).hexdigest()[:10]
+  if sb is True or not sb:
+    sb_tag = "sb" if sb else "nosb"
+  else:
+    sb_tag = "sb-" + "+".join(sb)
+  return os.path.join(CNF_CACHE_DIR, f"{n}_{sb_tag}_{encoding}_{digest}.cnf")
+
+def write_dimacs(solver, path):
+  """Bit-blast the assertions of solver to CNF and write them as DIMACS."""
+  from z3 import Goal, Then
+  goal = Goal()
+  goal.add(solver.assertions())
+  cnf = Then("simplify", "card2bv", "bit-blast", "tseitin-cnf")(goal)[0]
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  # Write to a temporary file first so a killed run never leaves a truncated cache entry
+  with open(path + ".tmp", "w") as f:
+    f.write(cnf.dimacs())
+  os.replace(path + ".tmp", path)
+
+def read_dimacs_names(path):
+  """Map DIMACS variable ids to the names of the model variables."""
+  names = {}
+  with open(path, "r") as f:
+    for line in f:
+      if line.startswith("c "):
+        parts = line.split()
+        if len(parts) == 3 and parts[1].isdigit():
+          names[int(parts[1])] = parts[2]
+  return names
+
+def solve_dimacs(path, backend="z3", timeout=300):
+  """
+  Solve a DIMACS file.
+  Args:
+      path: DIMACS file
+      backend: "z3" for Z3's SAT core, otherwise a solver binary that follows
+               the SAT competition output format (kissat, cadical, glucose, ...)
+      timeout: seconds
+  Returns:
+      (status, true_ids) where status is "sat", "unsat" or "unknown"
+  """
+  from z3 import SolverFor, sat, unsat
+  if backend == "z3":
+    solver = SolverFor("QF_FD")
+    solver.set("timeout", timeout * 1000)
+    solver.from_file(path)
+    result = solver.check()
+    if result != sat:
+      return ("unsat" if result == unsat else "unknown"), set()
+    # Z3 names DIMACS variable i "k!i"
+    true_ids = {int(name.split("!")[1]) for name in true_names(solver.model())}
+    return "sat", true_ids
+
+  try:
+    proc = subprocess.run([backend, path], capture_output=True, text=True, timeout=timeout)
+  except subprocess.TimeoutExpired:
+    return "unknown", set()
+  status = "unknown"
+  true_ids = set()
+  for line in proc.stdout.splitlines():
+    if line.startswith("s "):
+      if "UNSATISFIABLE" in line:
+        status = "unsat"
+      elif "SATISFIABLE" in line:
+        status = "sat"
+    elif line.startswith("v "):
+      true_ids.update(int(lit) for lit in line.split()[1:] if int(lit) > 0)
+  return status, true_ids
+
+def Sat_solution_cnf(n, sb, encoding="tensor", card=None, backend="z3", timeout=300):
+  # Same as Sat_solution, but through the cached DIMACS file
+  path = cnf_path(n, sb, encoding, card)
+  if not os.path.exists(path):
+    start_time = time.time()
+    solver, enc = build_solver(n, sb, encoding, card)
+    write_dimacs(solver, path)
+    print(f"Encoded {path} in {time.time() - start_time:.3f} seconds")
+  else:
+    print(f"Using cached encoding {path}")
+
+  start_time = time.time()
+  status, true_ids = solve_dimacs(path, backend, timeout)
+  time_spent = float(time.time() - start_time)
+
+  if status == "sat":
+    names = read_dimacs_names(path)
+    names_true = {names[i] for i in true_ids if i in names}
+    schedule = ENCODINGS[encoding].decode_names(n, names_true)
+    print(f"Solution found in {time_spent:.3f} seconds with {backend}")
+    return {
+      "time": time_spent,
+      "optimal": True,
+      "obj": None,
+      "sol": schedule}
+
+  elif status == "unsat":
+    print(f"After checking for {time_spent:.3f} seconds")
+    print("No solution exists")
+    print(f"{'-'*50}")
+    return {
+      "time": time_spent,
+      "optimal": True,
+      "obj": None,
+      "sol": None}
+
+  else:
+    print(f"No solution found within time limit ({timeout} seconds)")
+    return {
+      "time": timeout,
+      "optimal": False,
+      "obj": None,
+      "sol": None}
+
+####################################
+# Home/away fairness optimization
+#
+# Same objective as MIP.solve_tournament: sum over teams of
+# |home games - (n-1)/2|. The schedule model is built once; every improving
+# solution adds a tighter band [floor((n-1)/2) - d, ceil((n-1)/2) + d] on the
+# home games of each team, guarded by a fresh literal fair_d that is passed as
+# an assumption. Learned clauses survive from one bound to the next. With
+# d = 0 every team is at 1/2 from the target, which is the n/2 lower bound.
+
+def fairness_obj(solution, n):
+  """Home/away imbalance of a periods x weeks schedule, in MIP units."""
+  home = [0] * (n + 1)
+  for period in solution:
+    for home_team, away_team in period:
+      home[home_team] += 1
+  return int(round(sum(abs(home[t] - (n - 1) / 2) for t in range(1, n + 1))))
+
+def max_deviation(solution, n):
+  # How far the worst team is outside [floor((n-1)/2), ceil((n-1)/2)]
+  home = [0] * (n + 1)
+  for period in solution:
+    for home_team, away_team in period:
+      home[home_team] += 1
+  lo, hi = (n - 1) // 2, n // 2
+  return max(max(lo - home[t], home[t] - hi, 0) for t in range(1, n + 1))
+
+def Sat_optimize(n, sb, encoding="tensor", card=None, timeout=300):
+  from z3 import Bool, And, Or, Not, sat, unsat
+  # n: Number of teams (must be even)
+  start_time = time.time()
+  solver, enc = build_solver(n, sb, encoding, card, timeout, sb_orientation=False)
+  home_lits = [enc.home_literals(t) for t in range(n)]
+  lo, hi = (n - 1) // 2, n // 2
+
+  best = None
+  best_obj = None
+  curve = []
+  optimal = False
+  assumptions = []
+  while True:
+    remaining = timeout - (time.time() - start_time)
+    if remaining <= 0:
+      break
+    solver.set("timeout", int(remaining * 1000))
+    result = solver.check(assumptions)
+    elapsed = time.time() - start_time
+
+    if result == sat:
+      schedule = enc.decode_names(n, true_names(solver.model()))
+      obj = fairness_obj(schedule, n)
+      if best_obj is None or obj < best_obj:
+        best, best_obj = schedule, obj
+        curve.append([round(elapsed, 3), obj])
+        print(f"  obj {obj} after {elapsed:.3f} seconds")
+      if reaches_bound(best_obj, n):
+        optimal = True
+        break
+      d = max_deviation(schedule, n)
+      # Ask for a schedule whose worst team is strictly closer to the target
+      d -= 1
+      guard = Bool(f"fair_{d}")
+      for t in range(n):
+        bound = And(at_most_k(home_lits[t], hi + d, f"fair_{d}_{t}_le", enc.card["fairness"]),
+                    at_least_k(home_lits[t], lo - d, f"fair_{d}_{t}_ge", enc.card["fairness"]))
+        solver.add(Or(Not(guard), bound))
+      assumptions = [guard]
+
+    elif result == unsat:
+      # No schedule at all, or none with a tighter worst team. The bands bound the
+      # max deviation, not the summed objective, so UNSAT only proves the sum
+      # optimal when the incumbent is at the lower bound (which the loop above
+      # already stops at); otherwise the incumbent stays unproven.
+      optimal = best is None or reaches_bound(best_obj, n)
+      break
+
+    else:
+      break
+
+  time_spent = time.time() - start_time
+  if best is None:
+    print(f"No solution found within time limit ({timeout} seconds)" if not optimal else "No solution exists")
+  else:
+    print(f"Best objective {best_obj} ({'optimal' if optimal else 'not proven optimal'}) in {time_spent:.3f} seconds")
+  return {
+    "time": time_spent if optimal else timeout,
+    "optimal": optimal,
+    "obj": best_obj,
+    "sol": best,
+    "curve": curve}
+
+####################################
+# Portfolio
+#
+# Several variants of the same instance race in separate processes. A variant
+# is a dict with optional keys: seed, phase, restart (Z3 search parameters)
+# and sb, encoding, card, cnf (the solve() arguments). The first variant that
+# proves SAT or UNSAT wins and the others are terminated.
+
+DEFAULT_PORTFOLIO = [
+  {"seed": 0},
+  {"seed": 1, "encoding": "match"},
+  {"seed": 2, "phase": "random"},
+  {"seed": 3, "encoding": "match", "restart": "geometric"},
+  {"seed": 4, "encoding": "match", "card": {"slot": "pb", "pair": "pb"}},
+  {"seed": 5, "sb": ["fix_week1", "home_lower", "team0_weeks"], "encoding": "match"},
+  {"seed": 6, "sb": False, "encoding": "match"},
+  {"seed": 7, "encoding": "match", "card": {"team_period": "totalizer"}, "phase": "always_false"},
+]
+
+# Z3 has separate parameters for its SMT core and its SAT core; set both.
+# The names are the sat.phase / sat.restart values (z3 -pd); the SMT core takes
+# numbers (smt.phase_selection: 2 is plain phase caching, smt.restart_strategy:
+# 3 is fixed). It has no EMA restarts, so "ema" only changes the SAT core.
+SMT_PHASE = {"always_false": 0, "always_true": 1, "caching": 2, "random": 5}
+SMT_RESTART = {"geometric": 0, "luby": 2, "static": 3}
+
+def set_search_params(variant):
+  from z3 import set_param
+  seed = variant.get("seed", 0)
+  set_param("smt.random_seed", seed)
+  set_param("sat.random_seed", seed)
+  if "phase" in variant:
+    set_param("sat.phase", variant["phase"])
+    set_param("smt.phase_selection", SMT_PHASE[variant["phase"]])
+  if "restart" in variant:
+    set_param("sat.restart", variant["restart"])
+    if variant["restart"] in SMT_RESTART:
+      set_param("smt.restart_strategy", SMT_RESTART[variant["restart"]])
+
+def portfolio_worker(index, n, variant, timeout, queue):
+  set_search_params(variant)
+  result = solve(n, variant.get("sb", True), timeout, variant.get("encoding", "tensor"),
+                 variant.get("card"), variant.get("cnf"))
+  queue.put((index, result))
+
+def Sat_portfolio(n, variants=None, workers=None, timeout=300):
+  """
+  Race the variants on up to `workers` processes (default: one per core).
+  Variants beyond `workers` wait in a queue and start, with the time that is
+  left, whenever a running variant finishes without an answer.
+  Returns the winning result with the winning variant under "config".
+  """
+  import multiprocessing
+  from queue import Empty
+  variants = variants or DEFAULT_PORTFOLIO
+  workers = workers or multiprocessing.cpu_count()
+  if len(variants) > workers:
+    print(f"{len(variants)} variants on {workers} workers, variants {workers}..{len(variants) - 1} are queued")
+
+  start_time = time.time()
+  queue = multiprocessing.Queue()
+  processes = []
+
+  def launch(index):
+    remaining = max(1, int(timeout - (time.time() - start_time)))
+    proc = multiprocessing.Process(target=portfolio_worker, args=(index, n, variants[index], remaining, queue), daemon=True)
+    proc.start()
+    processes.append(proc)
+
+  for index in range(min(workers, len(variants))):
+    launch(index)
+  queued = list(range(len(processes), len(variants)))
+
+  winner = None
+  pending = len(processes)
+  try:
+    while pending and winner is None:
+      remaining = timeout - (time.time() - start_time)
+      if remaining <= 0:
+        break
+      try:
+        index, result = queue.get(timeout=remaining)
+      except Empty:
+        break
+      pending -= 1
+      # A timed-out variant is not an answer, keep waiting for the others
+      if result["optimal"] or result["sol"] is not None:
+        winner = (index, result)
+      elif queued and timeout - (time.time() - start_time) >= 1:
+        launch(queued.pop(0))
+        pending += 1
+  finally:
+    for proc in processes:
+      if proc.is_alive():
+        proc.terminate()
+    for proc in processes:
+      proc.join()
+
+  time_spent = time.time() - start_time
+  if winner is None:
+    print(f"No variant finished within time limit ({timeout} seconds)")
+    return {
+      "time": timeout,
+      "optimal": False,
+      "obj": None,
+      "sol": None,
+      "config": None}
+  index, result = winner
+  print(f"Variant {index} {variants[index]} won after {time_spent:.3f} seconds")
+  result["time"] = time_spent
+  result["config"] = variants[index]
+  return result
+
+####################################
+# Cube and conquer
+#
+# With sb=True the first week is fixed, so the instance splits cleanly on
+# which matches occupy the first `depth` periods of the second week. Each
+# cube is a list of assumption literals. Every worker process builds the
+# model once and then refutes the cubes it is handed one after the other;
+# the first SAT cube ends the search, UNSAT needs every cube refuted.
+
+def make_cubes(enc, depth):
+  """Team-disjoint choices for periods 0..depth-1 of week 2 (index 1)."""
+  # Matches fixed in the first week cannot be played again
+  played = set(enc.first_week_pairs())
+  cubes = [[]]
+  for p in range(min(depth, enc.periods)):
+    options = [(teams, lit) for teams, lit in enc.slot_options(1, p) if teams not in played]
+    cubes = [cube + [(teams, lit)] for cube in cubes for teams, lit in options
+             if not any(set(teams) & set(other) for other, _ in cube)]
+  return [[lit for _, lit in cube] for cube in cubes]
+
+# Model and cubes of the current worker process
+cube_worker = {}
+
+def cube_init(n, encoding, card, depth, deadline):
+  solver, enc = build_solver(n, True, encoding, card)
+  cube_worker.update(n=n, solver=solver, enc=enc, cubes=make_cubes(enc, depth), deadline=deadline)
+
+def cube_solve(index):
+  from z3 import sat, unsat
+  solver, enc = cube_worker["solver"], cube_worker["enc"]
+  remaining = cube_worker["deadline"] - time.time()
+  if remaining <= 0:
+    return index, "unknown", None
+  solver.set("timeout", int(remaining * 1000))
+  result = solver.check(*cube_worker["cubes"][index])
+  if result == sat:
+    return index, "sat", enc.decode_names(cube_worker["n"], true_names(solver.model()))
+  return index, "unsat" if result == unsat else "unknown", None
+
+def Sat_cube_and_conquer(n, encoding="tensor", card=None, depth=1, workers=None, timeout=300):
+  """
+  Split the sb=True model into cubes on week 2 and solve them on a process pool.
+  Stops at the first SAT cube; reports UNSAT only if every cube is refuted.
+  """
+  import multiprocessing
+  workers = workers or multiprocessing.cpu_count()
+  start_time = time.time()
+  # Only the cube count is needed here, the workers rebuild the literals
+  n_cubes = len(make_cubes(ENCODINGS[encoding](n, card), depth))
+  print(f"{n_cubes} cubes on {workers} workers")
+
+  status, schedule, refuted = "unknown", None, 0
+  pool = multiprocessing.Pool(workers, initializer=cube_init,
+                              initargs=(n, encoding, card, depth, start_time + timeout))
+  try:
+    for index, cube_status, cube_schedule in pool.imap_unordered(cube_solve, range(n_cubes)):
+      if cube_status == "sat":
+        status, schedule = "sat", cube_schedule
+        break
+      if cube_status == "unknown":
+        break
+      refuted += 1
+    else:
+      status = "unsat"
+  finally:
+    pool.terminate()
+    pool.join()
+
+  time_spent = float(time.time() - start_time)
+  print(f"{refuted} of {n_cubes} cubes refuted")
+  if status == "sat":
+    print(f"Solution found in {time_spent:.3f} seconds")
+    return {
+      "time": time_spent,
+      "optimal": True,
+      "obj": None,
+      "sol": schedule}
+
+  elif status == "unsat":
+    print(f"After checking for {time_spent:.3f} seconds")
+    print("No solution exists")
+    print(f"{'-'*50}")
+    return {
+      "time": time_spent,
+      "optimal": True,
+      "obj": None,
+      "sol": None}
+
+  else:
+    print(f"No solution found within time limit ({timeout} seconds)")
+    return {
+      "time": timeout,
+      "optimal": False,
+      "obj": None,
+      "sol": None}
+
+def solve(n, sb=True, timeout=300, encoding="tensor", card=None, cnf_backend=None, optimize=False, lazy=False):
+  """
+  Solve one STS instance with SAT.
+  Args:
+      n: Number of teams (must be even)
+      sb: add symmetry breaking constraints
+      timeout: time limit in seconds
+      encoding: "tensor", "match" or "fixed_week"
+      card: cardinality backend per constraint family, e.g. {"slot": "pb"}
+      cnf_backend: None to solve the Z3 model directly, otherwise "z3" or a
+                   DIMACS solver binary used on the cached CNF
+      optimize: minimize the home/away imbalance (adds "curve" to the result)
+      lazy: add the at-most-twice-per-period constraints only when violated
+  Returns:
+      dict with "time", "optimal", "obj" and "sol" (periods x weeks of [home, away])
+  """
+  if optimize:
+    return Sat_optimize(n, sb, encoding, card, timeout)
+  if lazy:
+    return Sat_solution_lazy(n, sb, encoding, card, timeout)
+  if cnf_backend:
+    return Sat_solution_cnf(n, sb, encoding, card, cnf_backend, timeout)
+  return Sat_solution(n, sb, encoding, card, timeout)
+
+####################################
+# Enumeration of distinct schedules
+#
+# One incremental solver; after every model a single blocking clause over the
+# W*P slot literals (plus the orientation literals if orientation=True) rules
+# that schedule out. Each schedule is appended to a JSONL file as soon as it
+# is found.
+
+def enumerate_schedules(n, sb=True, encoding="match", card=None, orientation=False, limit=None,
+                        timeout=300, out_path=None):
+  """
+  Yield distinct valid schedules (periods x weeks of [home, away]).
+  Args:
+      orientation: schedules that only differ in home/away count as distinct
+      limit: stop after this many schedules (None: until exhausted or timeout)
+      timeout: overall time limit in seconds
+      out_path: JSONL file, one {"index", "time", "sol"} object per line
+  """
+  from z3 import sat
+  solver, enc = build_solver(n, sb, encoding, card, timeout)
+  out = None
+  if out_path:
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    out = open(out_path, "w")
+  count = 0
+  start_time = time.time()
+  try:
+    while limit is None or count < limit:
+      remaining = timeout - (time.time() - start_time)
+      if remaining <= 0:
+        break
+      solver.set("timeout", int(remaining * 1000))
+      if solver.check() != sat:
+        break
+      schedule = enc.decode_names(n, true_names(solver.model()))
+      count += 1
+      if out:
+        out.write(json.dumps({"index": count, "time": round(time.time() - start_time, 3), "sol": schedule},
+                             separators=(",", ":")) + "\n")
+        out.flush()
+      yield schedule
+      solver.add(enc.blocking_clause(schedule, orientation))
+  finally:
+    if out:
+      out.close()
+    elapsed = time.time() - start_time
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"{count} schedules in {elapsed:.3f} seconds ({rate:.2f} schedules/s)")
+
+def compare_encodings(ns, sb, encodings=("tensor", "match"), card=None):
+  """Print variable count, clause count, build and solve time of each encoding per n."""
+  print(f"{'n':>4}  {'encoding':<8}  {'vars':>9}  {'clauses':>10}  {'build (s)':>9}  {'solve (s)':>9}  result")
+  for n in ns:
+    for encoding in encodings:
+      start_time = time.time()
+      solver, enc = build_solver(n, sb, encoding, card)
+      build_time = time.time() - start_time
+      n_vars, n_clauses = model_size(solver)
+      start_time = time.time()
+      result = solver.check()
+      solve_time = time.time() - start_time
+      print(f"{n:>4}  {encoding:<8}  {n_vars:>9}  {n_clauses:>10}  {build_time:>9.2f}  {solve_time:>9.2f}  {result}")
+
+def compare_card_backends(ns, sb, encoding="tensor", backends=CARD_BACKENDS):
+  """
+  For each constraint family, swap in every cardinality backend (the other
+  families keep the default) and print build and solve time per n.
+  """
+  print(f"{'n':>4}  {'family':<11}  {'backend':<9}  {'build (s)':>9}  {'solve (s)':>9}  result")
+  for n in ns:
+    for family in CARD_FAMILIES:
+      for backend in backends:
+        start_time = time.time()
+        solver, enc = build_solver(n, sb, encoding, {family: backend})
+        build_time = time.time() - start_time
+        start_time = time.time()
+        result = solver.check()
+        solve_time = time.time() - start_time
+        print(f"{n:>4}  {family:<11}  {backend:<9}  {build_time:>9.2f}  {solve_time:>9.2f}  {result}")
+
+def compare_sb_variants(ns, configs, encoding="tensor", card=None, timeout=300):
+  """Solve time of each symmetry breaking configuration, all on one encoded solver per n."""
+  print(f"{'n':>4}  {'build (s)':>9}  " + "  ".join(f"{'+'.join(c) or 'none':>24}" for c in configs))
+  for n in ns:
+    start_time = time.time()
+    solver, enc, guards = build_guarded_solver(n, encoding, card, timeout)
+    build_time = time.time() - start_time
+    times = []
+    for sb in configs:
+      result = check_schedule(solver, enc, n, timeout, sb_assumptions(enc, guards, sb))
+      times.append(f"{result['time']:.2f}" if result["sol"] is not None else "N/A")
+    print(f"{n:>4}  {build_time:>9.2f}  " + "  ".join(f"{t:>24}" for t in times))
+
 ##################################
 
-def save_solution(results, n, sb):
+def save_solution(results, n, sb, encoding="tensor", optimize=False, approach=None):
   """Save solution in the required JSON format, appending if file exists"""
   os.makedirs("res/SAT", exist_ok=True)
 
   if results["sol"] is not None:
-    approach = "Z3 + SB" if sb else "Z3 w/out SB"
+    if approach is None:
+      approach = "Z3 + SB" if sb else "Z3 w/out SB"
+      if optimize:
+        approach = approach.replace("Z3", "Z3 fair")
+      if encoding != "tensor":
+        approach = approach.replace("Z3", f"Z3 {encoding}")
     new_entry = {
       "time": int(results["time"]),
       "optimal": results["optimal"],
-      "obj": None,
+      "obj": results["obj"],
       "sol": results["sol"]
     }
+    if results.get("curve"):
+      new_entry["curve"] = results["curve"]
+    if results.get("config"):
+      new_entry["config"] = results["config"]
 
     filename = f"res/SAT/{n}.json"
 
@@ -308,7 +1487,13 @@ def save_solution(results, n, sb):
         f.write(f'  "{key}": {{\n')
         f.write(f'    "time": {value["time"]},\n')
         f.write(f'    "optimal": {str(value["optimal"]).lower()},\n')
-        f.write(f'    "obj": "None",\n')
+        if value["obj"] is None or value["obj"] == "None":
+          f.write(f'    "obj": "None",\n')
+        else:
+          f.write(f'    "obj": {value["obj"]},\n')
+        for extra in ("curve", "config"):
+          if extra in value:
+            f.write(f'    "{extra}": {json.dumps(value[extra], separators=(",", ":"))},\n')
         sol_str = json.dumps(value["sol"], separators=(",", ":"))
         f.write(f'    "sol": {sol_str}\n')
         f.write(f'  }}{comma}\n')
@@ -318,79 +1503,154 @@ def save_solution(results, n, sb):
 
 #################################
 
+def print_schedule(solution):
+  print()
+  print("          ", end="")
+  for week in range(len(solution[0])):
+      print(f"Week{week+1:<5}", end="  ")
+  print()
 
-# Number of teams
-team_n = [6,8,10,12,14,16,18,20]
-#team_n = [2,4,6]
+  for period_idx in range(len(solution)):
 
-Z3SB = []
-Z3WOSB = []
+    print(f"Period {period_idx+1}:", end=" ")
 
-symmetry_breaking = [False, True]
-for sb in symmetry_breaking:
-  for n in team_n:
-    if sb == True:
-      print("Z3 + SB")
-    else:
-      print("Z3 w/out SB")
-    output = Sat_solution(n,sb)
-    solution = output["sol"]
-    if solution == None and output["optimal"] == True:
-      if sb == True:
-        Z3SB.append("UNSAT")
+    for week_idx in range(len(solution[period_idx])):
+        home = solution[period_idx][week_idx][0]
+        away = solution[period_idx][week_idx][1]
+        print(f"{home} vs {away:<4}", end="  ")
+    print()
+  print()
+
+def parse_card(text):
+  # "pair=pb,slot=totalizer" -> {"pair": "pb", "slot": "totalizer"}
+  card = {}
+  if text:
+    for item in text.split(","):
+      family, backend = item.split("=")
+      card[family] = backend
+  return card
+
+def main(argv=None):
+  import argparse
+  parser = argparse.ArgumentParser(description="Solve STS instances with Z3 and save them to res/SAT")
+  # Number of teams
+  parser.add_argument("--teams", default="6,8,10,12,14,16,18,20", help="comma separated list of n")
+  parser.add_argument("--encoding", default="tensor", choices=sorted(ENCODINGS))
+  parser.add_argument("--card", default="", help="cardinality backends per family, e.g. pair=pb,slot=totalizer")
+  parser.add_argument("--cnf", nargs="?", const="z3", default=None, help="solve the cached DIMACS encoding with z3 or a solver binary")
+  parser.add_argument("--timeout", type=int, default=300)
+  parser.add_argument("--optimize", action="store_true", help="minimize the home/away imbalance like the MIP model")
+  parser.add_argument("--lazy", action="store_true", help="add the at-most-twice-per-period constraints only when violated")
+  parser.add_argument("--enumerate", type=int, default=None, metavar="K", help="stream up to K distinct schedules per n to pool/SAT/<n>.jsonl")
+  parser.add_argument("--cubes", nargs="?", type=int, const=1, default=None, metavar="DEPTH", help="cube and conquer on the first DEPTH periods of week 2")
+  parser.add_argument("--workers", type=int, default=None, help="processes for --portfolio / --cubes (default: all cores)")
+  parser.add_argument("--portfolio", nargs="?", type=int, const=0, default=None, help="race DEFAULT_PORTFOLIO on this many processes (default: all cores)")
+  parser.add_argument("--compare", action="store_true", help="print the encodings side by side instead")
+  parser.add_argument("--compare-card", action="store_true", help="benchmark every backend on every constraint family")
+  parser.add_argument("--compare-sb", default=None, help="symmetry breaking configurations to compare, e.g. 'none;fix_week1,home_lower;fix_week1,team0_weeks'")
+  args = parser.parse_args(argv)
+
+  team_n = [int(t) for t in args.teams.split(",")]
+  encoding = args.encoding
+  card = parse_card(args.card)
+
+  if args.compare:
+    compare_encodings(team_n, True, card=card)
+    return
+  if args.compare_card:
+    compare_card_backends(team_n, True, encoding)
+    return
+  if args.compare_sb:
+    configs = [[] if c == "none" else c.split(",") for c in args.compare_sb.split(";")]
+    compare_sb_variants(team_n, configs, encoding, card, args.timeout)
+    return
+
+  if args.enumerate is not None:
+    for n in team_n:
+      out_path = f"pool/SAT/{n}.jsonl"
+      for solution in enumerate_schedules(n, True, encoding, card, limit=args.enumerate,
+                                          timeout=args.timeout, out_path=out_path):
+        if not validate_solution(solution, n):
+          print("Solution failed the validation test")
+      print(f"Schedules for n={n} saved to {out_path}")
+    return
+
+  if args.portfolio is not None or args.cubes is not None:
+    approach = "Z3 portfolio" if args.portfolio is not None else "Z3 cubes + SB"
+    for n in team_n:
+      print(approach)
+      if args.portfolio is not None:
+        output = Sat_portfolio(n, workers=args.portfolio or args.workers, timeout=args.timeout)
       else:
-        Z3WOSB.append("UNSAT")
-    # if solution excit print it
-    if output["time"] == 300:
-      if sb == True:
-        Z3SB.append("N/A")
+        output = Sat_cube_and_conquer(n, encoding, card, args.cubes, args.workers, args.timeout)
+      if output["sol"] is None:
+        print("N/A")
+        break
+      print_schedule(output["sol"])
+      if validate_solution(output["sol"], n):
+        print("Solution passed the validation test")
       else:
-        Z3WOSB.append("N/A")
-      print("N/A")
+        print("Solution failed the validation test")
+      save_solution(output, n, True, approach=approach)
       print("-------------------------------")
+    return
+
+  Z3SB = []
+  Z3WOSB = []
+
+  # Configurations still running; one drops out after its first timeout
+  symmetry_breaking = [False, True]
+  for n in team_n:
+    if not symmetry_breaking:
       break
-    if solution != None:
+    if args.cnf or args.optimize or args.lazy:
+      outputs = [solve(n, sb, args.timeout, encoding, card, args.cnf, args.optimize, args.lazy) for sb in symmetry_breaking]
+    else:
+      # One encoding per n, symmetry breaking toggled through assumptions
+      outputs = Sat_solution_configs(n, symmetry_breaking, encoding, card, args.timeout)
+    for sb, output in zip(list(symmetry_breaking), outputs):
+      if sb == True:
+        print("Z3 + SB")
+      else:
+        print("Z3 w/out SB")
+      solution = output["sol"]
+      if solution == None and output["optimal"] == True:
         if sb == True:
-          Z3SB.append(int(output["time"]))
+          Z3SB.append("UNSAT")
         else:
-          Z3WOSB.append(int(output["time"]))
-        print()
-        print("          ", end="")
-        for week in range(len(solution[0])):
-            print(f"Week{week+1:<5}", end="  ")
-        print()
-
-        for period_idx in range(len(solution)):
-
-          print(f"Period {period_idx+1}:", end=" ")
-
-          for week_idx in range(len(solution[period_idx])):
-              home = solution[period_idx][week_idx][0]
-              away = solution[period_idx][week_idx][1]
-              print(f"{home} vs {away:<4}", end="  ")
-          print()
-        print()
-        if validate_solution(solution, n):
-          print("Solution passed the validation test")
+          Z3WOSB.append("UNSAT")
+      if output["optimal"] == False and solution == None:
+        if sb == True:
+          Z3SB.append("N/A")
         else:
-          print("Solution failed the validation test")
-        save_solution(output, n, sb)
+          Z3WOSB.append("N/A")
+        print("N/A")
         print("-------------------------------")
-print("Table 1: Results using Z3 + SB and Z3 w/out SB")
-print()
-print(f"# teams    ", end="")
-print("Z3 + SB    ", end="")
-print("Z3 w/out SB    ", end="")
-print()
-for i in range(2, n+1, 2):
-  print(f"   {i:<8}", end="")
-  try:
-    print(f"   {Z3SB[int(i/2-1)]:<8}", end="")
-  except:
-    print(f"   {'N/A':<3}", end="")
-  try:
-    print(f"   {Z3WOSB[int(i/2-1)]:<7}", end="")
-  except:
-    print(f"   {'N/A':<3}", end="")
+        symmetry_breaking.remove(sb)
+        continue
+      if solution != None:
+          if sb == True:
+            Z3SB.append(int(output["time"]))
+          else:
+            Z3WOSB.append(int(output["time"]))
+          print_schedule(solution)
+          if validate_solution(solution, n):
+            print("Solution passed the validation test")
+          else:
+            print("Solution failed the validation test")
+          save_solution(output, n, sb, encoding, args.optimize)
+          print("-------------------------------")
+  print("Table 1: Results using Z3 + SB and Z3 w/out SB")
+  print()
+  print(f"# teams    ", end="")
+  print("Z3 + SB    ", end="")
+  print("Z3 w/out SB    ", end="")
   print()
+  for i, n in enumerate(team_n):
+    print(f"   {n:<8}", end="")
+    print(f"   {Z3SB[i] if i < len(Z3SB) else 'N/A':<8}", end="")
+    print(f"   {Z3WOSB[i] if i < len(Z3WOSB) else 'N/A':<7}", end="")
+    print()
 
+if __name__ == "__main__":
+  main()